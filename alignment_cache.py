@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Alignment Cache - Content-addressed, disk-backed cache of MFA alignment results
+
+Results are keyed on a hash of the segment's PCM frames, the cleaned words and
+the dictionary/acoustic model identity, so re-aligning the same words against
+the same audio returns the stored timings without running MFA. The cache is
+bounded in size; the least recently used entries are evicted first.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class AlignmentCache:
+    """Disk-backed alignment result cache with size-based LRU eviction"""
+
+    def __init__(self, cache_dir, max_bytes=64 * 1024 * 1024):
+        """Initialize the cache
+
+        Args:
+            cache_dir: Directory the cache entries are stored in
+            max_bytes: Maximum total size of all entries (default: 64 MB)
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._total_bytes = sum(p.stat().st_size for p in self.cache_dir.glob('*/*.json'))
+
+    @staticmethod
+    def make_key(pcm_digest, words, model_identity):
+        """Build the cache key of a segment
+
+        Args:
+            pcm_digest: Hex digest of the segment's PCM frames
+            words: Cleaned words of the segment
+            model_identity: String identifying dictionary and acoustic model
+
+        Returns:
+            Hex string key
+        """
+        h = hashlib.sha256()
+        for part in (pcm_digest, ' '.join(words), model_identity):
+            h.update(part.encode('utf-8'))
+            h.update(b'\0')
+        return h.hexdigest()
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key):
+        """Return the cached alignment results for key, or None"""
+        path = self._path(key)
+        with self._lock:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    result = json.load(f)
+                # The mtime records the last use for LRU eviction
+                os.utime(path)
+            except (OSError, ValueError):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return result
+
+    def put(self, key, alignment_results):
+        """Store alignment results under key, evicting old entries if needed"""
+        path = self._path(key)
+        data = json.dumps(alignment_results).encode('utf-8')
+        with self._lock:
+            try:
+                path.parent.mkdir(exist_ok=True)
+                if path.exists():
+                    self._total_bytes -= path.stat().st_size
+                tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                self._total_bytes += len(data)
+            except OSError as e:
+                logger.warning(f"Could not write alignment cache entry {path}: {e}")
+                return
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Remove least recently used entries until the cache fits (lock must be held)"""
+        entries = []
+        for p in self.cache_dir.glob('*/*.json'):
+            try:
+                stat = p.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, p))
+        entries.sort()
+        self._total_bytes = sum(size for _, size, _ in entries)
+        for _, size, p in entries:
+            if self._total_bytes <= self.max_bytes:
+                break
+            try:
+                p.unlink()
+                self._total_bytes -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            for p in self.cache_dir.glob('*/*.json'):
+                try:
+                    p.unlink()
+                except OSError:
+                    pass
+            self._total_bytes = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+            "bytes": self._total_bytes,
+        }
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Audio Source - Time base, sample access and playback position for the recordings shown in the GUI
+"""
+import math
+import os
+import struct
+import threading
+
+import numpy as np
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class TimeBase:
+    """Converts between seconds and frame indices of a recording
+
+    Replaces a per-sample time axis (np.arange(0, n_frames/sr, 1/sr)): every
+    conversion is arithmetic, so no array of sample times is allocated and
+    lookups cost the same for any recording length.
+    """
+
+    def __init__(self, sr, n_frames):
+        """Initialize the time base
+
+        Args:
+            sr: Sample rate in Hz
+            n_frames: Number of frames in the recording
+        """
+        self.sr = sr
+        self.n_frames = n_frames
+
+    @property
+    def end(self):
+        """Time of the last frame in seconds"""
+        return max(self.n_frames - 1, 0) / self.sr
+
+    def to_time(self, frame):
+        """Return the time of a frame in seconds (clamped to the recording)"""
+        return min(max(frame, 0), max(self.n_frames - 1, 0)) / self.sr
+
+    def to_frame(self, t):
+        """Return the index of the last frame before time t (clamped to the recording)"""
+        frame = math.ceil(t * self.sr) - 1
+        return min(max(frame, 0), max(self.n_frames - 1, 0))
+
+    def to_frame_range(self, t0, t1):
+        """Return the (start, stop) frame indices covering [t0, t1) for slicing"""
+        start = min(max(math.floor(t0 * self.sr), 0), self.n_frames)
+        stop = min(max(math.ceil(t1 * self.sr), start), self.n_frames)
+        return start, stop
+
+
+class WavSource:
+    """Read-only memory map of the sample data in a WAV file
+
+    Only the RIFF header is parsed on open; samples are paged in from disk
+    when they are accessed, so opening a multi-hour recording is immediate
+    and plotting or extracting a segment only touches the pages it needs.
+
+    24 bit samples have no NumPy type: they are mapped as raw bytes (one
+    row of 3*n_channels bytes per frame), so frames are read and extracted
+    as for the other formats, and channel() decodes them for plotting.
+    32 bit float samples are mapped as float32 and flagged by is_float, so
+    playback and extraction do not take them for 32 bit PCM.
+    """
+
+    def __init__(self, path):
+        """Open a WAV file
+
+        Args:
+            path: Path to a PCM (8/16/24/32 bit) or float (32 bit) WAV file
+
+        Raises:
+            ValueError: If the file is not a supported WAV file
+        """
+        self.path = str(path)
+        fmt, data_offset, data_size = self._parse_header(self.path)
+        audio_format, self.n_channels, self.sr, _, self.block_align, bits = fmt
+        self.sampwidth = bits // 8
+        self.is_float = audio_format == WAVE_FORMAT_IEEE_FLOAT
+
+        if audio_format == WAVE_FORMAT_PCM and self.sampwidth in (1, 2, 3, 4):
+            dtype = {1: np.uint8, 2: '<i2', 3: np.uint8, 4: '<i4'}[self.sampwidth]
+        elif audio_format == WAVE_FORMAT_IEEE_FLOAT and self.sampwidth == 4:
+            dtype = '<f4'
+        else:
+            raise ValueError(f"Unsupported WAV format {audio_format:#x} "
+                             f"with {bits} bits per sample: {self.path}")
+        if self.block_align != self.sampwidth * self.n_channels:
+            raise ValueError(f"Unsupported WAV block alignment {self.block_align}: {self.path}")
+
+        # Streaming writers may leave the data size at 0 or 0xFFFFFFFF
+        file_size = os.path.getsize(self.path)
+        if not data_size or data_offset + data_size > file_size:
+            data_size = file_size - data_offset
+        self.n_frames = data_size // self.block_align
+        self.data_offset = data_offset
+
+        # One row per frame; 24 bit rows hold the raw bytes of all channels
+        row = 3 * self.n_channels if self.sampwidth == 3 else self.n_channels
+        if self.n_frames:
+            self.samples = np.memmap(self.path, dtype=dtype, mode='r', offset=data_offset,
+                                     shape=(self.n_frames, row))
+        else:
+            self.samples = np.zeros((0, row), dtype=dtype)
+        # Decoded 24 bit channels, by channel index
+        self._decoded = {}
+        self.timebase = TimeBase(self.sr, self.n_frames)
+
+    @staticmethod
+    def _parse_header(path):
+        """Return the fmt fields, data offset and data size of a WAV file"""
+        fmt = None
+        with open(path, 'rb') as f:
+            riff, _, wave_id = struct.unpack('<4sI4s', f.read(12))
+            if riff != b'RIFF' or wave_id != b'WAVE':
+                raise ValueError(f"Not a WAV file: {path}")
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    raise ValueError(f"No data chunk in WAV file: {path}")
+                chunk_id, chunk_size = struct.unpack('<4sI', header)
+                if chunk_id == b'fmt ':
+                    body = f.read(chunk_size)
+                    fmt = list(struct.unpack('<HHIIHH', body[:16]))
+                    if fmt[0] == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                        # The actual format is the first field of the sub-format GUID
+                        fmt[0] = struct.unpack('<H', body[24:26])[0]
+                    f.seek(chunk_size % 2, 1)
+                elif chunk_id == b'data':
+                    if fmt is None:
+                        raise ValueError(f"Data chunk before fmt chunk in WAV file: {path}")
+                    return fmt, f.tell(), chunk_size
+                else:
+                    # Chunks are padded to an even size
+                    f.seek(chunk_size + chunk_size % 2, 1)
+
+    def channel(self, i=0, chunk=1 << 22):
+        """Return the samples of one channel as a 1-D view of the memory map
+
+        24 bit samples are decoded to int32 instead (chunk frames at a time,
+        once per channel), since they cannot be viewed as numbers in place.
+        """
+        if self.sampwidth != 3:
+            return self.samples[:, i]
+        if i not in self._decoded:
+            decoded = np.empty(self.n_frames, dtype=np.int32)
+            for start in range(0, self.n_frames, chunk):
+                b = self.samples[start:start + chunk, 3*i:3*i + 3]
+                # Little endian, the sign is in the high byte
+                decoded[start:start + len(b)] = (b[:, 0].astype(np.int32)
+                                                 | b[:, 1].astype(np.int32) << 8
+                                                 | b[:, 2].view(np.int8).astype(np.int32) << 16)
+            self._decoded[i] = decoded
+        return self._decoded[i]
+
+    def read_frames(self, start, n_frames):
+        """Return n_frames raw frames starting at frame start (like wave's readframes)"""
+        start = min(max(int(start), 0), self.n_frames)
+        stop = min(start + max(int(n_frames), 0), self.n_frames)
+        return self.samples[start:stop].tobytes()
+
+    def close(self):
+        """Drop the memory map (it is unmapped once no views of it remain)"""
+        self.samples = self.samples[:0]
+        self._decoded = {}
+
+
+class Playhead:
+    """Playback position in a WavSource
+
+    The position belongs to playback alone: the audio callback reads the
+    frames at the position and advances it, the GUI seeks it. Segment
+    extraction and plotting read the source by explicit frame offsets, so
+    they never disturb playback and need no lock around their reads.
+
+    The position is where the next read starts, which runs ahead of what is
+    heard by the output latency. When reads are given the stream time at
+    which their frames reach the output, audible_frame interpolates the
+    frame that is heard at any stream time.
+    """
+
+    def __init__(self, source):
+        """Initialize the playhead at the start of the recording
+
+        Args:
+            source: WavSource to play
+        """
+        self.source = source
+        self.frame = 0
+        # Playback ends at this frame (the end of a segment, or of the recording)
+        self.stop = source.n_frames
+        # (first frame, end frame, output time) of the last read, and the frame playing started at
+        self._anchor = None
+        self._start = 0
+        # Only guards the position update, never a read
+        self._lock = threading.Lock()
+
+    def seek(self, frame, stop=None):
+        """Move the playhead to a frame (clamped to the recording)
+
+        Args:
+            frame: Frame to play from
+            stop: Frame to stop playing at (None: the end of the recording)
+        """
+        n_frames = self.source.n_frames
+        with self._lock:
+            self.frame = min(max(int(frame), 0), n_frames)
+            self.stop = n_frames if stop is None else min(max(int(stop), self.frame), n_frames)
+            self._anchor = None
+            self._start = self.frame
+
+    def tell(self):
+        """Return the frame the next read starts at"""
+        return self.frame
+
+    def read(self, n_frames, output_time=None):
+        """Return up to n_frames raw frames from the playhead and advance it
+
+        Never reads past the stop frame, so a segment ends on its exact frame.
+
+        Args:
+            n_frames: Number of frames requested
+            output_time: Stream time at which the first frame will be heard
+                (optional, enables audible_frame)
+
+        Returns:
+            Tuple of (frames, finished), finished is True once the stop frame is reached
+        """
+        with self._lock:
+            start = self.frame
+            self.frame = max(min(start + max(int(n_frames), 0), self.stop), start)
+            stop = self.frame
+            finished = stop >= self.stop
+            if output_time:
+                self._anchor = (start, stop, output_time)
+        return self.source.read_frames(start, stop - start), finished
+
+    def audible_frame(self, now):
+        """Return the (fractional) frame heard at stream time now
+
+        Interpolated from the output time of the last read, so it advances
+        smoothly between reads. Frames before the playing started or beyond
+        the ones read are never returned. Without output times this is the
+        playhead position.
+        """
+        anchor = self._anchor
+        if anchor is None:
+            return self.frame
+        start, stop, output_time = anchor
+        frame = start + (now - output_time) * self.source.sr
+        return min(max(frame, self._start), stop)
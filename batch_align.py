@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Batch Aligner - Aligns many audio/transcript pairs without the GUI
+
+The manifest is a .csv file with one recording per line:
+
+    audio.wav,transcript.txt[,output.csv]
+
+Lines starting with # are ignored. Without an output column the result is
+written to <output-dir>/<audio stem>.csv in the same format as the GUI's Save.
+
+Example:
+    python batch_align.py manifest.csv --output-dir aligned --jobs 4
+"""
+import argparse
+import csv
+import json
+import logging
+import multiprocessing.util
+import sys
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from mfa_aligner import SegmentAligner, install_signal_handlers, load_config, write_words_csv
+from workspace import close_pools, get_pool
+
+logger = logging.getLogger(__name__)
+
+
+def read_manifest(manifest_path, output_dir):
+    """Read the manifest
+
+    Args:
+        manifest_path: Path to manifest file
+        output_dir: Directory for results without an explicit output path
+
+    Returns:
+        List of job dictionaries with audio, text and output paths
+    """
+    jobs = []
+    with open(manifest_path, newline='') as f:
+        for row in csv.reader(f):
+            row = [col.strip() for col in row]
+            if not row or not row[0] or row[0].startswith('#'):
+                continue
+            if len(row) < 2:
+                raise ValueError(f"Manifest line needs audio and transcript: {','.join(row)}")
+            audio, text = row[0], row[1]
+            if len(row) > 2 and row[2]:
+                output = row[2]
+            else:
+                output = str(Path(output_dir) / (Path(audio).stem + '.csv'))
+            jobs.append({"audio": audio, "text": text, "output": output})
+    return jobs
+
+
+def align_file(job, config):
+    """Align one recording (runs in a worker process)
+
+    Args:
+        job: Job dictionary with audio, text and output paths
+        config: Model configuration as returned by load_config
+
+    Returns:
+        Dictionary with the job's outcome and timing
+    """
+    start = time.time()
+    summary = dict(job, ok=False, error=None, n_words=0, n_aligned=0, audio_seconds=0.0)
+    # Every job gets its own workspace so parallel MFA runs never share files;
+    # the jobs of one worker process reuse the workspaces of its pool
+    workspace = get_pool(in_memory=config.get("in_memory", False)).acquire()
+    try:
+        with wave.open(job["audio"], mode='rb') as wav:
+            summary["audio_seconds"] = wav.getnframes() / float(wav.getframerate())
+
+        # A batch aligns every file once, so there is nothing to cache
+        sa = SegmentAligner(
+            job["audio"], job["text"], workspace.path,
+            dictionary_path=config.get("dictionary_path"),
+            acoustic_model_path=config.get("acoustic_model_path"),
+            use_pretrained_acoustic=config.get("use_pretrained_acoustic"),
+            cache_dir=False,
+            workspace=workspace
+        )
+        sa.align_all()
+        sa.source.close()
+
+        summary["n_words"] = len(sa.all_aligned_words)
+        summary["n_aligned"] = int(sa.all_aligned_words.aligned.sum())
+        Path(job["output"]).parent.mkdir(parents=True, exist_ok=True)
+        write_words_csv(job["output"], sa.all_aligned_words)
+
+        if summary["n_words"] and not summary["n_aligned"]:
+            summary["error"] = "no words aligned"
+        else:
+            summary["ok"] = True
+    except Exception as e:
+        summary["error"] = str(e)
+    finally:
+        workspace.release()
+        summary["wall_seconds"] = time.time() - start
+    return summary
+
+
+def init_worker():
+    """Remove the worker process's workspaces when it exits
+
+    Pool workers end with os._exit, which skips atexit hooks, but they do run
+    multiprocessing finalizers with an exit priority.
+    """
+    multiprocessing.util.Finalize(None, close_pools, exitpriority=10)
+
+
+def run_batch(jobs, config, num_workers=None):
+    """Align all jobs in a process pool
+
+    Args:
+        jobs: List of job dictionaries (see read_manifest)
+        config: Model configuration as returned by load_config
+        num_workers: Number of worker processes (defaults to the CPU count)
+
+    Returns:
+        Dictionary with per-file results and totals
+    """
+    start = time.time()
+    results = []
+    with ProcessPoolExecutor(max_workers=num_workers, initializer=init_worker) as pool:
+        futures = {pool.submit(align_file, job, config): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker process died (crash, OOM kill, signal); align_file
+                # never returned, so record the job as failed and go on
+                result = dict(futures[future], ok=False, error=f"worker failed: {e!r}",
+                              n_words=0, n_aligned=0, audio_seconds=0.0, wall_seconds=0.0)
+            results.append(result)
+            status = "ok" if result["ok"] else f"FAILED ({result['error']})"
+            logger.info(f"{result['audio']}: {status} in {result['wall_seconds']:.1f}s")
+    wall_seconds = time.time() - start
+
+    # Throughput counts the files that were aligned, not the ones that failed fast
+    succeeded = [r for r in results if r["ok"]]
+    audio_seconds = sum(r["audio_seconds"] for r in succeeded)
+    return {
+        "files": len(results),
+        "succeeded": len(succeeded),
+        "failed": len(results) - len(succeeded),
+        "wall_seconds": wall_seconds,
+        "audio_seconds": audio_seconds,
+        "files_per_second": len(succeeded) / wall_seconds if wall_seconds else 0.0,
+        "realtime_factor": audio_seconds / wall_seconds if wall_seconds else 0.0,
+        "results": sorted(results, key=lambda r: r["audio"]),
+    }
+
+
+def print_summary(summary, stream=sys.stdout):
+    for r in summary["results"]:
+        status = "ok" if r["ok"] else f"FAILED: {r['error']}"
+        stream.write(f"{r['wall_seconds']:8.1f}s  {r['n_aligned']:6d}/{r['n_words']:<6d} "
+                     f"{r['audio']}  {status}\n")
+    stream.write(
+        f"\n{summary['files']} files, {summary['succeeded']} succeeded, "
+        f"{summary['failed']} failed in {summary['wall_seconds']:.1f}s "
+        f"({summary['files_per_second']:.2f} files/s, "
+        f"{summary['realtime_factor']:.1f}x realtime)\n"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Align many wav/txt pairs with MFA")
+    parser.add_argument("manifest", help="CSV file with audio,transcript[,output] per line")
+    parser.add_argument("--output-dir", default=".", help="Directory for the .csv results")
+    parser.add_argument("--jobs", "-j", type=int, default=None,
+                        help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--config", default=None, help="MFA configuration file")
+    parser.add_argument("--dictionary", default=None, help="Path to dictionary file")
+    parser.add_argument("--acoustic-model", default=None, help="Path or name of acoustic model")
+    parser.add_argument("--summary", default=None, help="Write the summary as JSON to this file")
+    parser.add_argument("--in-memory", action="store_true",
+                        help="Keep the temporary MFA files on /dev/shm")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    install_signal_handlers()
+
+    config = load_config(args.config)
+    if args.dictionary:
+        config["dictionary_path"] = args.dictionary
+    if args.acoustic_model:
+        config["acoustic_model_path"] = args.acoustic_model
+    config["in_memory"] = args.in_memory
+
+    jobs = read_manifest(args.manifest, args.output_dir)
+    logger.info(f"Aligning {len(jobs)} files")
+    summary = run_batch(jobs, config, num_workers=args.jobs)
+    print_summary(summary)
+
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+
+    return 0 if not summary["failed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -12,18 +12,22 @@ import os
 import sys
 import re
 import signal
+import threading
 import time
 import wave  # Add this import
 from pathlib import Path
-import soundfile as sf
-import numpy as np
 from typing import Callable, Dict, Optional
 import atexit
 import weakref
 import contextlib
+import hashlib
+from alignment_cache import AlignmentCache
+from audio_source import WavSource
+from mfa_worker import AlignmentWorker
+from word_table import WordTable
+from workspace import get_pool
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+# Logging is configured by the application (semi_align.py, batch_align.py)
 logger = logging.getLogger(__name__)
 
 # Global registry of temporary directories to clean up
@@ -44,13 +48,18 @@ def _cleanup_temp_dirs():
 # Register cleanup on normal exit
 atexit.register(_cleanup_temp_dirs)
 
-# Register cleanup on signals
-for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
-    try:
-        signal.signal(sig, lambda s, f: (_cleanup_temp_dirs(), sys.exit(1)))
-    except (AttributeError, ValueError):
-        # Some signals might not be available on all platforms
-        pass
+def install_signal_handlers():
+    """Clean up temporary directories when the process is terminated
+    
+    Installs process-wide SIGTERM/SIGINT/SIGHUP handlers, so only applications
+    call this (from their main thread), never library code on import.
+    """
+    for sig in ("SIGTERM", "SIGINT", "SIGHUP"):
+        try:
+            signal.signal(getattr(signal, sig), lambda s, f: (_cleanup_temp_dirs(), sys.exit(1)))
+        except (AttributeError, ValueError):
+            # Some signals might not be available on all platforms
+            pass
 
 @contextlib.contextmanager
 def temp_directory():
@@ -59,7 +68,9 @@ def temp_directory():
     try:
         yield temp_dir
     finally:
-        _cleanup_temp_dirs()
+        # Only this directory; the others may still be in use
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        _temp_dirs_to_cleanup.discard(str(temp_dir))
 
 def load_config(config_path=None):
     """Load configuration from a JSON file
@@ -102,33 +113,167 @@ def load_config(config_path=None):
     
     return default_config
 
+def write_words_csv(file_path, words):
+    """Write aligned words to a .csv file in the format used by semi_align.py
+    
+    Args:
+        file_path: Path to output file
+        words: List of (id_string, word, start, end) tuples
+    """
+    with open(file_path, 'w', newline='') as csvfile:
+        cswrriter = csv.writer(csvfile)
+        for ww in words:
+            if ww[3] is not None:
+                cswrriter.writerow([ww[0], ww[1], "{:.5f}".format(
+                        float(ww[2])), "{:.5f}".format(float(ww[3]))])
+            else:
+                cswrriter.writerow([ww[0], ww[1], "NaN", "NaN"])
+
+def read_words_csv(file_path):
+    """Read aligned words from a .csv file written by write_words_csv
+    
+    Args:
+        file_path: Path to the .csv file
+        
+    Returns:
+        List of (id_string, word, start, end) tuples (start/end None if unaligned)
+    """
+    words = []
+    with open(file_path, newline='') as csvfile:
+        cwreader = csv.reader(csvfile, delimiter=' ', quotechar='|')
+        for row in cwreader:
+            word = row[0].split(sep=',')
+            if word[3] == 'NaN':
+                words.append((word[0], word[1], None, None))
+            else:
+                words.append((word[0], word[1], float(word[2]), float(word[3])))
+    return words
+
+class ModelRegistry:
+    """Remembers which dictionary/acoustic model combinations have been validated
+
+    Validation results are kept in memory and in a JSON sidecar file, keyed on
+    the dictionary's path, mtime and size and the acoustic model name (or path,
+    mtime and size). A key changes, and so forces re-validation, only when one
+    of the models changes.
+    """
+
+    DEFAULT_SIDECAR = "~/.mfa_model_registry.json"
+
+    # Shared between all registries using the same sidecar
+    _memory = {}
+    _lock = threading.Lock()
+
+    def __init__(self, sidecar_path=None):
+        """Initialize the registry
+
+        Args:
+            sidecar_path: Path to the JSON sidecar file (optional)
+        """
+        self.sidecar_path = Path(os.path.expanduser(sidecar_path or self.DEFAULT_SIDECAR))
+
+    @staticmethod
+    def _file_identity(path):
+        stat = Path(path).stat()
+        return f"{os.path.abspath(path)}:{stat.st_mtime_ns}:{stat.st_size}"
+
+    @classmethod
+    def model_key(cls, dictionary_path, acoustic_model_path, use_pretrained_acoustic):
+        """Build the cache key for a dictionary/acoustic model combination
+
+        Raises:
+            OSError: If one of the model files does not exist
+        """
+        dictionary = cls._file_identity(dictionary_path)
+        if use_pretrained_acoustic:
+            acoustic = f"pretrained:{acoustic_model_path}"
+        else:
+            acoustic = cls._file_identity(acoustic_model_path)
+        return f"{dictionary}|{acoustic}"
+
+    def _entries(self):
+        """Return the in-memory entries, loading the sidecar on first use"""
+        key = str(self.sidecar_path)
+        if key not in self._memory:
+            entries = {}
+            if self.sidecar_path.exists():
+                try:
+                    with open(self.sidecar_path, 'r', encoding='utf-8') as f:
+                        entries = json.load(f)
+                except Exception as e:
+                    logger.warning(f"Ignoring unreadable model registry {self.sidecar_path}: {e}")
+            self._memory[key] = entries
+        return self._memory[key]
+
+    def _save(self, entries):
+        try:
+            self.sidecar_path.parent.mkdir(exist_ok=True, parents=True)
+            tmp_path = self.sidecar_path.with_name(self.sidecar_path.name + f".{os.getpid()}.tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, indent=2)
+            os.replace(tmp_path, self.sidecar_path)
+        except Exception as e:
+            logger.warning(f"Could not write model registry {self.sidecar_path}: {e}")
+
+    def is_validated(self, key):
+        with self._lock:
+            return key in self._entries()
+
+    def mark_validated(self, key):
+        with self._lock:
+            entries = self._entries()
+            entries[key] = {"validated_at": time.time()}
+            self._save(entries)
+
+    def invalidate(self, key=None):
+        """Forget one validated combination, or all of them if key is None"""
+        with self._lock:
+            entries = self._entries()
+            if key is None:
+                entries.clear()
+            else:
+                entries.pop(key, None)
+            self._save(entries)
+
 class MFAWrapper:
     """Wrapper for Montreal Forced Aligner"""
     
+    _validation_lock = threading.Lock()
+    
     def __init__(self, audiofile=None, textfile=None, temp_path=None, cache_dir=None, 
-                 dictionary_path=None, acoustic_model_path=None, use_pretrained_acoustic=None):
+                 dictionary_path=None, acoustic_model_path=None, use_pretrained_acoustic=None,
+                 use_worker=False, worker_backend="mfa", workspace=None, in_memory=False):
         """Initialize the aligner
         
         Args:
             audiofile: Path to audio file (for compatibility with semi_align.py)
             textfile: Path to text file (for compatibility with semi_align.py)
-            temp_path: Path to use as temporary directory
+            temp_path: Directory the workspaces are created in (optional, defaults
+                to a temporary directory)
             cache_dir: Path to use for caching models
             dictionary_path: Path to dictionary file (overrides default)
             acoustic_model_path: Path or name of acoustic model (overrides default)
             use_pretrained_acoustic: Whether to use a pretrained model (overrides default)
+            use_worker: Whether to align in a persistent worker process (see mfa_worker.py)
+            worker_backend: Backend of the worker process ("mfa" or "stub")
+            workspace: Workspace to work in (optional, see workspace.py); by default
+                one is taken from the process-wide pool and released by close()
+            in_memory: Whether the default pool lives on /dev/shm (optional)
         """
         # Store cache directory
         self.cache_dir = Path(cache_dir) if cache_dir else None
         
-        # Create temporary directory if not provided
-        if temp_path:
-            self.temp_dir = Path(temp_path)
-        else:
-            self.temp_dir = Path(tempfile.mkdtemp())
-            _temp_dirs_to_cleanup.add(str(self.temp_dir))
+        # A workspace of our own, so concurrent aligners never touch each other's files
+        self._owns_workspace = workspace is None
+        if workspace is None:
+            root = Path(temp_path) / "workspaces" if temp_path and not in_memory else None
+            workspace = get_pool(root, in_memory=in_memory).acquire()
+        self.workspace = workspace
+        self.temp_dir = workspace.path
         
         logger.info(f"Using temporary directory: {self.temp_dir}")
+        # Corpus directory of the one-shot `mfa align` (a single tmp.wav/tmp.txt utterance)
+        self.corpus_dir = workspace.corpus_dir
         
         # Initialize with default models - use full paths
         # Default paths that can be overridden
@@ -139,10 +284,19 @@ class MFAWrapper:
         # Expand user directory (~ symbol)
         self.dictionary_path = os.path.expanduser(self.dictionary_path)
     
+        # Validation results are cached next to the models cache (or in the home directory)
+        sidecar = self.cache_dir / "model_registry.json" if self.cache_dir else None
+        self.model_registry = ModelRegistry(sidecar)
+    
+        # Persistent alignment worker, falls back to one-shot `mfa align` if unavailable
+        self.worker_backend = worker_backend
+        self._worker = None
+        if use_worker:
+            self.start_worker()
         
         # For compatibility with semi_align.py
         self.audio = None
-        self.all_aligned_words = []
+        self.all_aligned_words = WordTable()
         self.audio_sel = (0, -1)
         self.aligned_words = []
         self.selected_words = []
@@ -165,16 +319,9 @@ class MFAWrapper:
         with open(textfile, 'r') as texthandle:
             text = texthandle.read()
         
-        # Split text into words
+        # Split text into words, all unaligned (w0, w1, ...)
         all_words = text.split()
-        self.all_aligned_words = []
-        tmpid = 0
-        
-        # Initialize all aligned words with None 
-        for ww in all_words:
-            idstring = "w" + str(tmpid)
-            self.all_aligned_words.append((idstring, ww.lower(), None, None))
-            tmpid += 1
+        self.all_aligned_words = WordTable.from_text([ww.lower() for ww in all_words])
     
     def align_all(self):
         """Align all words in the text (for compatibility with semi_align.py)"""
@@ -288,32 +435,60 @@ class MFAWrapper:
         logger.info(f"Wrote audio selection to {audio_path}")
         return audio_path
 
+    def start_worker(self, backend=None):
+        """Start a persistent alignment worker that keeps the models loaded
+        
+        The worker loads the models in the background; align() waits for it
+        on first use and falls back to the one-shot subprocess if it fails.
+        
+        Args:
+            backend: Backend of the worker process (defaults to self.worker_backend)
+        """
+        if backend:
+            self.worker_backend = backend
+        self.stop_worker()
+        try:
+            self._worker = AlignmentWorker(
+                self.dictionary_path, self.acoustic_model_path, backend=self.worker_backend
+            )
+            self._worker.start()
+        except Exception as e:
+            logger.warning(f"Could not start alignment worker: {e}")
+            self._worker = None
+    
+    def stop_worker(self):
+        """Stop the persistent alignment worker if one is running"""
+        if self._worker is not None:
+            self._worker.close()
+            self._worker = None
+
     def __del__(self):
         """Clean up resources when the object is garbage collected"""
         self._cleanup()
     
+    def close(self):
+        """Stop the worker and hand the workspace back to its pool for the next aligner"""
+        self._cleanup()
+    
     def _cleanup(self):
         """
         Clean up temporary resources created during alignment.
         
-        This method removes temporary directories created by the aligner
-        if they were created by this instance (self._owns_temp_dir is True).
-        It also removes the directory from the global cleanup registry.
+        This method stops the worker and releases the workspace if it was
+        taken from the pool by this instance (self._owns_workspace is True).
+        The pool keeps it for reuse or removes it; other aligners' workspaces
+        are never touched.
         
         Exceptions during cleanup are logged but not raised.
         """
-        if hasattr(self, '_owns_temp_dir') and self._owns_temp_dir and hasattr(self, 'temp_dir'):
+        if getattr(self, '_worker', None) is not None:
+            self.stop_worker()
+        if getattr(self, '_owns_workspace', False) and getattr(self, 'workspace', None) is not None:
             try:
-                # Only clean up if we created the directory
-                if self.temp_dir and self.temp_dir.exists():
-                    shutil.rmtree(self.temp_dir, ignore_errors=True)
-                    logger.info(f"Cleaned up temporary directory: {self.temp_dir}")
-                    
-                    # Remove from global registry
-                    global _temp_dirs_to_cleanup
-                    _temp_dirs_to_cleanup.discard(str(self.temp_dir))
+                self.workspace.release()
+                self.workspace = None
             except Exception as e:
-                logger.error(f"Error cleaning up temporary directory: {e}")
+                logger.error(f"Error releasing workspace: {e}")
     
     def _check_models_available(self):
         """Check if models are available and download if needed"""
@@ -407,43 +582,84 @@ class MFAWrapper:
         Raises:
             RuntimeError: If models are not valid
         """
-        try:
-            # Check if dictionary path exists
-            dict_path = Path(self.dictionary_path)
-            if not dict_path.exists():
-                raise RuntimeError(f"Dictionary file not found: {dict_path}")
-            
-            # Check if acoustic model exists - either as a path or as a pretrained model
-            if self.use_pretrained_acoustic:
-                # Check if the pretrained model is available
-                models = self.list_available_models()
-                logger.info(f"Checking if acoustic model '{self.acoustic_model_path}' is in available models: {models['acoustic_models']}")
+        # One validation at a time, so an align waits for a running prewarm()
+        # instead of starting the same subprocesses again
+        with self._validation_lock:
+            try:
+                # Check if dictionary path exists
+                dict_path = Path(self.dictionary_path)
+                if not dict_path.exists():
+                    raise RuntimeError(f"Dictionary file not found: {dict_path}")
+            
+                # Skip the `mfa model list` subprocesses if these models were validated before
+                key = self.model_identity()
+                if self.model_registry.is_validated(key):
+                    logger.debug(f"Models already validated: {key}")
+                    return True
+            
+                # Check if acoustic model exists - either as a path or as a pretrained model
+                if self.use_pretrained_acoustic:
+                    # Check if the pretrained model is available
+                    models = self.list_available_models()
+                    logger.info(f"Checking if acoustic model '{self.acoustic_model_path}' is in available models: {models['acoustic_models']}")
                 
-                if self.acoustic_model_path in models["acoustic_models"]:
-                    logger.info(f"Acoustic model '{self.acoustic_model_path}' is already available")
+                    if self.acoustic_model_path in models["acoustic_models"]:
+                        logger.info(f"Acoustic model '{self.acoustic_model_path}' is already available")
+                    else:
+                        # Only try to download if not already available
+                        logger.info(f"Acoustic model '{self.acoustic_model_path}' not found locally, attempting to download...")
+                        download_result = subprocess.run(
+                            ["mfa", "model", "download", "acoustic", self.acoustic_model_path],
+                            capture_output=True,
+                            text=True,
+                            check=True
+                        )
+                        logger.info(f"Downloaded acoustic model: {self.acoustic_model_path}")
                 else:
-                    # Only try to download if not already available
-                    logger.info(f"Acoustic model '{self.acoustic_model_path}' not found locally, attempting to download...")
-                    download_result = subprocess.run(
-                        ["mfa", "model", "download", "acoustic", self.acoustic_model_path],
-                        capture_output=True,
-                        text=True,
-                        check=True
-                    )
-                    logger.info(f"Downloaded acoustic model: {self.acoustic_model_path}")
-            else:
-                # Check if acoustic model path exists as a file
-                model_path = Path(self.acoustic_model_path)
-                if not model_path.exists():
-                    raise RuntimeError(f"Acoustic model not found: {model_path}")
+                    # Check if acoustic model path exists as a file
+                    model_path = Path(self.acoustic_model_path)
+                    if not model_path.exists():
+                        raise RuntimeError(f"Acoustic model not found: {model_path}")
             
-            logger.info(f"Using dictionary: {dict_path}")
-            logger.info(f"Using acoustic model: {self.acoustic_model_path}")
+                logger.info(f"Using dictionary: {dict_path}")
+                logger.info(f"Using acoustic model: {self.acoustic_model_path}")
             
-            return True
-        except Exception as e:
-            logger.error(f"Error validating models: {e}")
-            raise RuntimeError(f"Error validating models: {e}")
+                self.model_registry.mark_validated(key)
+                return True
+            except Exception as e:
+                logger.error(f"Error validating models: {e}")
+                raise RuntimeError(f"Error validating models: {e}")
+    
+    def prewarm(self):
+        """Validate the models in a background thread
+        
+        Call this as soon as the models are known (e.g. when a file is
+        chosen), so the first align finds them in the model registry instead
+        of waiting for the `mfa model list` subprocesses. Errors are only
+        logged here; align() validates again and raises them.
+        
+        Returns:
+            threading.Thread: The started daemon thread
+        """
+        def run():
+            try:
+                self._validate_models()
+            except RuntimeError as e:
+                logger.warning(f"Could not pre-warm the models: {e}")
+        
+        thread = threading.Thread(target=run, name="mfa-prewarm", daemon=True)
+        thread.start()
+        return thread
+    
+    def model_identity(self):
+        """Return a string identifying the current dictionary and acoustic model
+        
+        The identity changes whenever the dictionary file (or a local acoustic
+        model file) is modified or replaced.
+        """
+        return ModelRegistry.model_key(
+            self.dictionary_path, self.acoustic_model_path, self.use_pretrained_acoustic
+        )
     
     def _prepare_audio(self, audio_path: Path) -> Path:
         """
@@ -466,12 +682,19 @@ class MFAWrapper:
             # Create output path
             output_path = mfa_tmp_dir / f"{audio_stem}.wav"
             
-            # Verify audio format
-            import soundfile as sf
-            data, sample_rate = sf.read(audio_path)
+            # Verify audio format from the header only, without reading the samples
+            try:
+                source = WavSource(audio_path)
+                n_channels, sample_rate = source.n_channels, source.sr
+                source.close()
+            except ValueError:
+                # soundfile is slow to import and only needed for files WavSource cannot read
+                import soundfile as sf
+                info = sf.info(str(audio_path))
+                n_channels, sample_rate = info.channels, info.samplerate
             
             # Verify mono
-            if len(data.shape) > 1:
+            if n_channels > 1:
                 raise RuntimeError(
                     "Audio must be mono (single channel). Current audio has multiple channels.\n\n"
                     "To convert using Audacity:\n"
@@ -491,10 +714,10 @@ class MFAWrapper:
                     "3. Export as WAV: File > Export > Export as WAV"
                 )
             
-            # Copy WAV file
-            import shutil
-            shutil.copy(audio_path, output_path)
-            logger.info(f"Copied audio to {output_path}")
+            # Copy WAV file, unless it was written there in the first place
+            if Path(audio_path).resolve() != output_path.resolve():
+                shutil.copy(audio_path, output_path)
+                logger.info(f"Copied audio to {output_path}")
             
             return output_path
             
@@ -517,15 +740,19 @@ class MFAWrapper:
     
     def align(self, audio_path: Path, text_path: Path, 
               progress_callback: Callable[[float, str], None] = None,
-              timeout: int = 1800) -> Dict:
+              timeout: int = 1800, use_worker: bool = True) -> Dict:
         """
         Run alignment on audio and text files with timeout
         
+        Files that are already in the corpus directory (see write_audio_selection)
+        are used in place; others are copied there.
+        
         Args:
             audio_path: Path to audio file
             text_path: Path to text file
             progress_callback: Callback function for progress updates
             timeout: Maximum time in seconds to wait for alignment (default: 30 minutes)
+            use_worker: Whether to try the persistent worker first (default: True)
             
         Returns:
             Dictionary with alignment results
@@ -537,36 +764,47 @@ class MFAWrapper:
             
             # Validate models
             self._validate_models()
-            
+
+            # Use the persistent worker if one is running
+            if use_worker and self._worker is not None:
+                try:
+                    if progress_callback:
+                        progress_callback(0.2, "Aligning in worker...")
+                    alignment_results = self._worker.align(audio_path, text_path, timeout=timeout)
+                    if progress_callback:
+                        progress_callback(1.0, "Alignment complete")
+                    return alignment_results
+                except Exception as e:
+                    logger.warning(f"Alignment worker failed, falling back to mfa align: {e}")
+                    if not self._worker.is_alive():
+                        self.stop_worker()
+
             # Update progress
             if progress_callback:
                 progress_callback(0.1, "Preparing files...")
             
-            # Clean up existing directories and files
-            mfa_tmp_dir = self.temp_dir / "mfa_tmp"
-            output_dir = self.temp_dir / "aligned"
-            
-            # Remove existing directories to ensure clean state
-            for dir_path in [output_dir]:
-                if dir_path.exists():
-                    shutil.rmtree(dir_path)
-                dir_path.mkdir(exist_ok=True, parents=True)
+            # Empty the output directory of the previous run (the directory is reused)
+            mfa_tmp_dir = self.corpus_dir
+            output_dir = self.workspace.subdir("aligned", clear=True)
             
             # Make sure mfa_tmp directory exists
             mfa_tmp_dir.mkdir(exist_ok=True, parents=True)
             
-            # Copy audio file to mfa_tmp directory
+            # Copy audio file to mfa_tmp directory (unless it was written there)
             audio_filename = "tmp.wav"
             target_audio_path = mfa_tmp_dir / audio_filename
-            shutil.copy(audio_path, target_audio_path)
+            if Path(audio_path).resolve() != target_audio_path.resolve():
+                shutil.copy(audio_path, target_audio_path)
             
             # Copy text content to a text file with same name but .txt extension
+            # (text written there is expected to be on one line already)
             text_filename = "tmp.txt"
             target_text_path = mfa_tmp_dir / text_filename
-            with open(text_path, 'r', encoding='utf-8') as src:
-                text_content = src.read().replace('\n', ' ').strip()
-            with open(target_text_path, 'w', encoding='utf-8') as dst:
-                dst.write(text_content)
+            if Path(text_path).resolve() != target_text_path.resolve():
+                with open(text_path, 'r', encoding='utf-8') as src:
+                    text_content = src.read().replace('\n', ' ').strip()
+                with open(target_text_path, 'w', encoding='utf-8') as dst:
+                    dst.write(text_content)
             
             logger.info(f"Prepared audio: {target_audio_path}")
             logger.info(f"Prepared text: {target_text_path}")
@@ -575,57 +813,7 @@ class MFAWrapper:
             if progress_callback:
                 progress_callback(0.2, "Starting alignment...")
             
-            # Run MFA alignment with timeout and --clean flag
-            cmd = [
-                "mfa",
-                "align",
-                "--clean",  # Force clean previous alignments
-                str(mfa_tmp_dir),  # Directory containing audio and text files
-                str(self.dictionary_path),
-            ]
-
-            # Add the acoustic model - either as a name or path
-            if self.use_pretrained_acoustic:
-                cmd.append(self.acoustic_model_path)
-            else:
-                cmd.append(str(self.acoustic_model_path))
-
-            # Add the output directory
-            cmd.append(str(output_dir))
-
-            logger.info(f"Running command: {' '.join(cmd)}")
-            
-            # Use shell=True on Windows to find commands in PATH
-            shell = sys.platform == 'win32'
-            
-            # Start process with timeout
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                shell=shell,
-                bufsize=1  # Line buffered
-            )
-            
-            # Wait for process to complete with timeout
-            try:
-                stdout, stderr = process.communicate(timeout=timeout)
-                
-                # Log output
-                if stdout:
-                    logger.info(f"MFA stdout: {stdout}")
-                if stderr:
-                    logger.warning(f"MFA stderr: {stderr}")
-                    
-                # Check return code
-                if process.returncode != 0:
-                    raise RuntimeError(f"MFA alignment failed with return code {process.returncode}")
-                    
-            except subprocess.TimeoutExpired:
-                # Kill process if it times out
-                process.kill()
-                raise RuntimeError(f"MFA alignment timed out after {timeout} seconds")
+            self._run_mfa_align(mfa_tmp_dir, output_dir, timeout)
             
             # Update progress
             if progress_callback:
@@ -651,6 +839,171 @@ class MFAWrapper:
             logger.error(traceback.format_exc())
             raise RuntimeError(f"Error running alignment: {e}")
     
+    def align_region(self, audio_path: Path, begin: float, end: float, text: str,
+                     progress_callback: Callable[[float, str], None] = None,
+                     timeout: int = 1800) -> Optional[Dict]:
+        """
+        Align text to a region of an audio file without extracting the region
+        
+        Only the persistent worker reads a region of a file in place; the
+        one-shot `mfa align` needs a corpus directory with files of its own.
+        
+        Args:
+            audio_path: Path to audio file
+            begin: Start of the region in seconds
+            end: End of the region in seconds
+            text: Normalized transcript of the region
+            progress_callback: Callback function for progress updates
+            timeout: Maximum time in seconds to wait for alignment (default: 30 minutes)
+            
+        Returns:
+            Dictionary with alignment results (times relative to begin), or None
+            if no worker is running or it failed, so the region has to be written out
+        
+        Raises:
+            RuntimeError: If the models are not valid
+        """
+        if self._worker is None:
+            return None
+        if progress_callback:
+            progress_callback(0.05, "Validating models...")
+        self._validate_models()
+        try:
+            if progress_callback:
+                progress_callback(0.2, "Aligning in worker...")
+            alignment_results = self._worker.align(
+                audio_path, timeout=timeout, begin=begin, end=end, transcript=text
+            )
+            if progress_callback:
+                progress_callback(1.0, "Alignment complete")
+            return alignment_results
+        except Exception as e:
+            logger.warning(f"Alignment worker failed, falling back to mfa align: {e}")
+            if not self._worker.is_alive():
+                self.stop_worker()
+            return None
+    
+    def align_corpus(self, corpus_dir: Path, num_jobs: Optional[int] = None,
+                     progress_callback: Callable[[float, str], None] = None,
+                     timeout: int = 1800) -> Dict[str, Dict]:
+        """
+        Align every utterance in a corpus directory with a single `mfa align` run
+
+        Args:
+            corpus_dir: Directory containing one .wav/.txt pair per utterance
+            num_jobs: Number of parallel MFA jobs (-j)
+            progress_callback: Callback function for progress updates
+            timeout: Maximum time in seconds to wait for alignment (default: 30 minutes)
+
+        Returns:
+            Dictionary mapping each utterance name (file stem) to its alignment results
+        """
+        try:
+            if progress_callback:
+                progress_callback(0.05, "Validating models...")
+
+            self._validate_models()
+
+            output_dir = self.workspace.subdir("aligned_batch", clear=True)
+
+            if progress_callback:
+                progress_callback(0.2, "Starting alignment...")
+
+            self._run_mfa_align(Path(corpus_dir), output_dir, timeout, num_jobs=num_jobs)
+
+            if progress_callback:
+                progress_callback(0.8, "Processing results...")
+
+            results = {}
+            for textgrid_file in output_dir.glob("**/*.TextGrid"):
+                results[textgrid_file.stem] = self._parse_textgrid(textgrid_file)
+            logger.info(f"Aligned {len(results)} utterances from {corpus_dir}")
+
+            if progress_callback:
+                progress_callback(1.0, "Alignment complete")
+
+            return results
+
+        except Exception as e:
+            logger.error(f"Error running corpus alignment: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            raise RuntimeError(f"Error running corpus alignment: {e}")
+
+    def _run_mfa_align(self, corpus_dir: Path, output_dir: Path, timeout: int,
+                       num_jobs: Optional[int] = None):
+        """
+        Run `mfa align` on a corpus directory
+        
+        Args:
+            corpus_dir: Directory containing audio and text files
+            output_dir: Directory the TextGrid files are written to
+            timeout: Maximum time in seconds to wait for alignment
+            num_jobs: Number of MFA jobs (-j), MFA's default if None
+        
+        Raises:
+            RuntimeError: If MFA fails or times out
+        """
+        # Run MFA alignment with timeout and --clean flag. MFA keeps its state in
+        # a temporary directory of this workspace, so concurrent runs do not share
+        # (and clean) one state directory; --clean is still needed because every
+        # run brings different audio under the same corpus name
+        cmd = [
+            "mfa",
+            "align",
+            "--clean",  # Force clean previous alignments
+            "--temporary_directory", str(self.workspace.mfa_temp_dir),
+        ]
+        if num_jobs:
+            cmd += ["-j", str(num_jobs)]
+        cmd += [
+            str(corpus_dir),  # Directory containing audio and text files
+            str(self.dictionary_path),
+        ]
+
+        # Add the acoustic model - either as a name or path
+        if self.use_pretrained_acoustic:
+            cmd.append(self.acoustic_model_path)
+        else:
+            cmd.append(str(self.acoustic_model_path))
+
+        # Add the output directory
+        cmd.append(str(output_dir))
+
+        logger.info(f"Running command: {' '.join(cmd)}")
+        
+        # Use shell=True on Windows to find commands in PATH
+        shell = sys.platform == 'win32'
+        
+        # Start process with timeout
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            shell=shell,
+            bufsize=1  # Line buffered
+        )
+        
+        # Wait for process to complete with timeout
+        try:
+            stdout, stderr = process.communicate(timeout=timeout)
+            
+            # Log output
+            if stdout:
+                logger.info(f"MFA stdout: {stdout}")
+            if stderr:
+                logger.warning(f"MFA stderr: {stderr}")
+                
+            # Check return code
+            if process.returncode != 0:
+                raise RuntimeError(f"MFA alignment failed with return code {process.returncode}")
+                
+        except subprocess.TimeoutExpired:
+            # Kill process if it times out
+            process.kill()
+            raise RuntimeError(f"MFA alignment timed out after {timeout} seconds")
+    
     def _parse_textgrid(self, textgrid_path):
         """Parse TextGrid file using a similar approach to the original SegmentAligner
         
@@ -868,40 +1221,44 @@ class SegmentAligner:
     def clean_word(self, w):
         return re.sub(r'[^\w\s]', '', w.lower())  # Strip punctuation
     
-    def __init__(self, audiofile, textfile, temp_path, dictionary_path=None, 
-                 acoustic_model_path=None, use_pretrained_acoustic=None):
+    def __init__(self, audiofile, textfile, temp_path, dictionary_path=None,
+                 acoustic_model_path=None, use_pretrained_acoustic=None,
+                 use_worker=False, worker_backend="mfa", cache_dir=None,
+                 cache_max_bytes=64 * 1024 * 1024, workspace=None, in_memory=False):
         """Initialize the aligner
-        
+
         Args:
             audiofile: Path to audio file
             textfile: Path to text file
-            temp_path: Path to use as temporary directory
+            temp_path: Path to use as temporary directory (holds the alignment
+                cache and the pool of workspaces)
             dictionary_path: Path to dictionary file (optional)
             acoustic_model_path: Path or name of acoustic model (optional)
             use_pretrained_acoustic: Whether to use a pretrained model (optional)
+            use_worker: Whether to keep the models loaded in a worker process (optional)
+            worker_backend: Backend of the worker process, "mfa" or "stub" (optional)
+            cache_dir: Directory of the alignment result cache (optional, defaults
+                to temp_path/alignment_cache; False disables the cache)
+            cache_max_bytes: Maximum size of the alignment result cache (optional)
+            workspace: Workspace for the MFA files (optional, see MFAWrapper)
+            in_memory: Whether to keep the MFA files on /dev/shm (optional)
         """
         # Store temp directory
         self.temp_path = temp_path
         if not os.path.exists(temp_path):
             os.makedirs(temp_path, exist_ok=True)
         
-        # Open audio file
-        self.audio = wave.open(audiofile, mode='rb')
+        # Memory-mapped samples, read by frame offset for playback, plotting and
+        # segment extraction alike (there is no shared file position)
+        self.source = WavSource(audiofile)
         
         # Read text file
         with open(textfile, 'r') as texthandle:
             text = texthandle.read()
         
-        # Split text into words
+        # Split text into words, all unaligned (w0, w1, ...)
         all_words = text.split()
-        self.all_aligned_words = []
-        tmpid = 0
-        
-        # Initialize all aligned words with None 
-        for ww in all_words:
-            idstring = "w" + str(tmpid)
-            self.all_aligned_words.append((idstring, ww.lower(), None, None))
-            tmpid += 1
+        self.all_aligned_words = WordTable.from_text([ww.lower() for ww in all_words])
         
         self.audio_sel = (0, -1)
         self.aligned_words = []
@@ -912,113 +1269,306 @@ class SegmentAligner:
             temp_path=temp_path,
             dictionary_path=dictionary_path,
             acoustic_model_path=acoustic_model_path,
-            use_pretrained_acoustic=use_pretrained_acoustic
+            use_pretrained_acoustic=use_pretrained_acoustic,
+            use_worker=use_worker,
+            worker_backend=worker_backend,
+            workspace=workspace,
+            in_memory=in_memory
         )
-    
+        
+        # Cache of alignment results keyed on audio content, words and models
+        self.selection_digest = None
+        if cache_dir is False:
+            self.cache = None
+        else:
+            self.cache = AlignmentCache(
+                cache_dir or Path(temp_path) / 'alignment_cache', max_bytes=cache_max_bytes
+            )
+
     def align_all(self):
         """Align all words in the text"""
         self.align_segment((0, -1), (0, None))
     
-    def align_segment(self, audio_sel, word_sel):
+    def align_segment(self, audio_sel, word_sel, progress_callback=None):
         """Align a segment of audio to a selection of words
         
         Args:
             audio_sel: Tuple of (start_time, end_time) in seconds
             word_sel: Tuple of (start_index, end_index) in words list
+            progress_callback: Callback function for progress updates (optional)
             
         Returns:
             List of aligned words with timing information
         """
-        self.audio_sel = audio_sel
-        self.selected_words = self.all_aligned_words[word_sel[0]:word_sel[1]]
+        selected_words = self.all_aligned_words[word_sel[0]:word_sel[1]]
+        try:
+            words_id = self.align_words(audio_sel, selected_words, progress_callback)
+        except Exception as e:
+            logger.error(f'MFA alignment failed: {e}')
+            import traceback
+            logger.error(traceback.format_exc())
+            return [(ww[0], ww[1], None, None) for ww in selected_words]
         
-        # Write temporary files
-        audio_path = self.write_audio_selection()
-        text_path = self.write_text_selection()
+        self.all_aligned_words[word_sel[0]:word_sel[1]] = words_id
+        return words_id
+    
+    def align_words(self, audio_sel, selected_words, progress_callback=None):
+        """Align a segment of audio to a list of words without updating all_aligned_words
         
-        # Run alignment
-        try:
-            # Run MFA alignment
-            alignment_results = self.mfa.align(audio_path, text_path)
-            
-            # Convert MFA results to the format expected by semi_align.py
-            # This format is (word, start_time, end_time) without the ID
-            words = []
-            for word_info in alignment_results.get('words', []):
-                # Skip silence markers
-                if word_info.get('word', '').lower() in ['sp', 'sil', '']:
-                    continue
-                    
-                words.append((
-                    word_info.get('word', '').lower(),
-                    word_info.get('start', 0) + self.audio_sel[0],
-                    word_info.get('end', 0) + self.audio_sel[0]
-                ))
+        This lets the GUI align in a background thread and merge the result
+        on the main thread. Alignments should not run concurrently, since they
+        share the temporary files.
+        
+        Args:
+            audio_sel: Tuple of (start_time, end_time) in seconds
+            selected_words: List of (id_string, word, start, end) tuples
+            progress_callback: Callback function for progress updates (optional)
             
-            logger.info(f"Found {len(words)} aligned words")
-            self.aligned_words = words
+        Returns:
+            List of aligned words with timing information
+        
+        Raises:
+            RuntimeError: If the alignment fails
+        """
+        self.audio_sel = audio_sel
+        self.selected_words = selected_words
+        
+        # Identify the selected audio from the memory map, without writing it
+        start_frame, end_frame = self.selection_frames()
+        self.selection_digest = self._selection_digest(start_frame, end_frame)
+        
+        # Return cached timings if this audio was aligned to these words before
+        cache_key = self._cache_key()
+        alignment_results = self.cache.get(cache_key) if cache_key else None
+        if alignment_results is not None:
+            logger.info(f"Alignment cache hit (hit rate: {self.cache.hit_rate:.0%})")
+            if progress_callback:
+                progress_callback(1.0, "Alignment complete (cached)")
+            return self._match_alignment(alignment_results, audio_sel, selected_words)
+        
+        # The worker reads the selection from the original file by offset
+        sr = self.source.sr
+        alignment_results = self.mfa.align_region(
+            self.source.path, start_frame / sr, end_frame / sr, self.selection_text(),
+            progress_callback
+        )
+        if alignment_results is None:
+            # `mfa align` gets the selection written once, straight into its corpus directory
+            audio_path = self.write_audio_selection()
+            text_path = self.write_text_selection()
+            alignment_results = self.mfa.align(audio_path, text_path, progress_callback,
+                                               use_worker=False)
+        if cache_key:
+            self.cache.put(cache_key, alignment_results)
+            logger.info(f"Alignment cache miss (hit rate: {self.cache.hit_rate:.0%})")
+        return self._match_alignment(alignment_results, audio_sel, selected_words)
+    
+    def align_segments(self, selections, num_jobs=None):
+        """Align several segments with a single MFA run
+        
+        Each segment is written as its own utterance into one corpus directory,
+        so the MFA startup and model loading cost is paid once for all of them.
+        
+        Args:
+            selections: List of (audio_sel, word_sel) tuples as for align_segment
+            num_jobs: Number of parallel MFA jobs (defaults to one per segment, up to the CPU count)
             
-            # Update word timings in all_aligned_words
-            words_id = []
-            i = 0
-            for ww in self.all_aligned_words[word_sel[0]:word_sel[1]]:
-                # Clean the word before comparison
-                clean_original = self.clean_word(ww[1])
-                if i >= len(words) or not clean_original == words[i][0].lower():
-                    logger.warning(f'Word "{ww[1]}" has not been aligned... skipping')
-                    words_id.append((ww[0], ww[1], None, None))
-                else:
-                    words_id.append((ww[0], ww[1], words[i][1], words[i][2]))
-                    i += 1
+        Returns:
+            List with the aligned words of each segment
+        """
+        if not selections:
+            return []
+        if num_jobs is None:
+            num_jobs = min(len(selections), os.cpu_count() or 1)
+        
+        corpus_dir = self.mfa.workspace.subdir('mfa_batch', clear=True)
+        
+        # Write one utterance per segment that is not in the cache yet
+        names = []
+        cache_keys = {}
+        results = {}
+        for n, (audio_sel, word_sel) in enumerate(selections):
+            name = f"seg{n:04d}"
+            names.append(name)
+            self.audio_sel = audio_sel
+            self.selected_words = self.all_aligned_words[word_sel[0]:word_sel[1]]
+            self.selection_digest = self._selection_digest(*self.selection_frames())
+            cache_key = self._cache_key()
+            cached = self.cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                results[name] = cached
+                continue
+            cache_keys[name] = cache_key
+            self.write_audio_selection(corpus_dir / f"{name}.wav")
+            self.write_text_selection(corpus_dir / f"{name}.txt")
+        
+        if cache_keys:
+            try:
+                aligned = self.mfa.align_corpus(corpus_dir, num_jobs=min(num_jobs, len(cache_keys)))
+            except Exception as e:
+                logger.error(f'MFA batch alignment failed: {e}')
+                aligned = {}
+            for name, alignment_results in aligned.items():
+                if cache_keys.get(name):
+                    self.cache.put(cache_keys[name], alignment_results)
+            results.update(aligned)
+        if self.cache:
+            logger.info(f"{len(selections) - len(cache_keys)} of {len(selections)} segments "
+                        f"taken from the alignment cache (hit rate: {self.cache.hit_rate:.0%})")
+        
+        all_words_id = []
+        for name, (audio_sel, word_sel) in zip(names, selections):
+            if name in results:
+                all_words_id.append(self._merge_alignment(results[name], audio_sel, word_sel))
+            else:
+                logger.warning(f'Segment {name} has not been aligned... skipping')
+                all_words_id.append([(ww[0], ww[1], None, None)
+                                     for ww in self.all_aligned_words[word_sel[0]:word_sel[1]]])
+        return all_words_id
+    
+    def _cache_key(self):
+        """Return the cache key of the current selection, or None without a cache"""
+        if self.cache is None or self.selection_digest is None:
+            return None
+        try:
+            model_identity = self.mfa.model_identity()
+        except OSError:
+            # Missing model files; alignment will report the error
+            return None
+        if self.mfa.worker_backend != "mfa":
+            # Other backends (the stub's dummy timings) must never be served as MFA results
+            model_identity += f"|backend:{self.mfa.worker_backend}"
+        words = [self.clean_word(item[1]) for item in self.selected_words if item[1].strip()]
+        return AlignmentCache.make_key(self.selection_digest, words, model_identity)
+    
+    def _merge_alignment(self, alignment_results, audio_sel, word_sel):
+        """Write MFA results for one segment into all_aligned_words
+        
+        Args:
+            alignment_results: Dictionary with alignment results from MFAWrapper
+            audio_sel: Tuple of (start_time, end_time) in seconds
+            word_sel: Tuple of (start_index, end_index) in words list
             
-            self.all_aligned_words[word_sel[0]:word_sel[1]] = words_id
-            return words_id
+        Returns:
+            List of aligned words with timing information
+        """
+        words_id = self._match_alignment(
+            alignment_results, audio_sel, self.all_aligned_words[word_sel[0]:word_sel[1]]
+        )
+        self.all_aligned_words[word_sel[0]:word_sel[1]] = words_id
+        return words_id
+    
+    def _match_alignment(self, alignment_results, audio_sel, selected_words):
+        """Assign MFA results for one segment to the selected words
+        
+        Args:
+            alignment_results: Dictionary with alignment results from MFAWrapper
+            audio_sel: Tuple of (start_time, end_time) in seconds
+            selected_words: List of (id_string, word, start, end) tuples
             
-        except Exception as e:
-            logger.error(f'MFA alignment failed: {e}')
-            import traceback
-            logger.error(traceback.format_exc())
-            return [(ww[0], ww[1], None, None) for ww in self.selected_words]
+        Returns:
+            List of aligned words with timing information
+        """
+        # Convert MFA results to the format expected by semi_align.py
+        # This format is (word, start_time, end_time) without the ID
+        words = []
+        for word_info in alignment_results.get('words', []):
+            # Skip silence markers
+            if word_info.get('word', '').lower() in ['sp', 'sil', '']:
+                continue
+                
+            words.append((
+                word_info.get('word', '').lower(),
+                word_info.get('start', 0) + audio_sel[0],
+                word_info.get('end', 0) + audio_sel[0]
+            ))
+        
+        logger.info(f"Found {len(words)} aligned words")
+        self.aligned_words = words
+        
+        # Match the aligned words to the selected words in order
+        words_id = []
+        i = 0
+        for ww in selected_words:
+            # Clean the word before comparison
+            clean_original = self.clean_word(ww[1])
+            if i >= len(words) or not clean_original == words[i][0].lower():
+                logger.warning(f'Word "{ww[1]}" has not been aligned... skipping')
+                words_id.append((ww[0], ww[1], None, None))
+            else:
+                words_id.append((ww[0], ww[1], words[i][1], words[i][2]))
+                i += 1
+        
+        return words_id
     
-    def write_text_selection(self):
-        """Write selected text to a temporary file"""
-        text_path = Path(self.temp_path) / 'tmp.txt'
+    def selection_text(self):
+        """Return the selected words normalized for MFA, on one line"""
+        cleaned_words = [self.clean_word(item[1]) for item in self.selected_words if item[1].strip()]
+        return ' '.join(cleaned_words)
+
+    def write_text_selection(self, text_path=None):
+        """Write the normalized selected text (to the MFA corpus directory unless text_path is given)"""
+        if text_path:
+            text_path = Path(text_path)
+        else:
+            self.mfa.corpus_dir.mkdir(exist_ok=True, parents=True)
+            text_path = self.mfa.corpus_dir / 'tmp.txt'
         with open(text_path, 'w') as f:
-            cleaned_words = [self.clean_word(item[1]) for item in self.selected_words if item[1].strip()]
-            text = ' '.join(cleaned_words)
-            f.write(text)
+            f.write(self.selection_text())
         
         logger.info(f"Writing text selection to {text_path}")
         return text_path
 
-    def write_audio_selection(self):
-        """Write selected audio to a temporary file (for compatibility with semi_align.py)"""
-        start_sec = self.audio_sel[0]
-        end_sec = self.audio_sel[1]
-        logger.info(f"Writing audio selection from {start_sec:.3f}s to {end_sec:.3f}s")
-
-        audio_path = Path(self.temp_path) / 'tmp.wav'
-        tmp_audio = wave.open(str(audio_path), mode='wb')
-        tmp_audio.setparams(self.audio.getparams())
-
-        sr = tmp_audio.getframerate()
-        max_frames = self.audio.getnframes()
+    def selection_frames(self):
+        """Return the (start, end) frames of audio_sel, clamped to the recording"""
+        sr = self.source.sr
+        max_frames = self.source.n_frames
 
-        start_frame = round(start_sec * sr)
-        end_frame = round(end_sec * sr)
+        start_frame = round(self.audio_sel[0] * sr)
+        # A negative end (as in align_all's (0, -1)) selects until the end of the file
+        end_frame = round(self.audio_sel[1] * sr) if self.audio_sel[1] >= 0 else max_frames
 
         # Clamp frame indices to valid range
         start_frame = max(0, min(start_frame, max_frames))
-        end_frame = max(0, min(end_frame, max_frames))
-        n_frames2write = end_frame - start_frame
+        end_frame = max(start_frame, min(end_frame, max_frames))
+        return start_frame, end_frame
 
-        # Read and write the correct portion of the audio
-        posnow = self.audio.tell()
-        self.audio.setpos(start_frame)
-        data = self.audio.readframes(n_frames2write)
-        tmp_audio.writeframes(data)
-        self.audio.setpos(posnow)
-        tmp_audio.close()
+    def _selection_digest(self, start_frame, end_frame):
+        """Hash the format and the frames of the selection (identifies it in the alignment cache)"""
+        params = (self.source.n_channels, self.source.sampwidth, self.source.sr)
+        if self.source.is_float:
+            params += ('float',)
+        digest = hashlib.sha256(repr(params).encode('utf-8'))
+        # Hashed straight from the memory map, without copying the frames
+        digest.update(self.source.samples[start_frame:end_frame])
+        return digest.hexdigest()
+
+    def write_audio_selection(self, audio_path=None):
+        """Write the selected audio (to the MFA corpus directory unless audio_path is given)
+        
+        The frames go from the memory map to the file in one write. Float
+        samples are converted to 16 bit PCM, which the wave module can write
+        and MFA reads. The caller sets selection_digest (it hashes the frames
+        before deciding to write them).
+        """
+        start_frame, end_frame = self.selection_frames()
+        logger.info(f"Writing audio selection from {self.audio_sel[0]:.3f}s to {self.audio_sel[1]:.3f}s")
+
+        if audio_path:
+            audio_path = Path(audio_path)
+        else:
+            self.mfa.corpus_dir.mkdir(exist_ok=True, parents=True)
+            audio_path = self.mfa.corpus_dir / 'tmp.wav'
+        frames = self.source.samples[start_frame:end_frame]
+        sampwidth = self.source.sampwidth
+        if self.source.is_float:
+            frames = (frames.clip(-1.0, 1.0) * 32767).astype('<i2')
+            sampwidth = 2
+        with wave.open(str(audio_path), mode='wb') as tmp_audio:
+            tmp_audio.setnchannels(self.source.n_channels)
+            tmp_audio.setsampwidth(sampwidth)
+            tmp_audio.setframerate(self.source.sr)
+            tmp_audio.writeframes(frames)
         
         return audio_path
 
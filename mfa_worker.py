@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+MFA Worker - Long-lived alignment process that keeps the acoustic model and
+dictionary loaded between segment alignments
+
+The worker talks JSON lines over stdin/stdout. After loading the models it
+writes one ready message, then answers one response per job:
+
+    -> {"id": 1, "audio": "/path/tmp.wav", "text": "/path/tmp.txt"}
+    <- {"id": 1, "ok": true, "result": {"words": [...], "duration": 3.2}}
+
+A job can also give the transcript inline and align a region of a longer
+file in place, with times relative to begin:
+
+    -> {"id": 2, "audio": "/path/talk.wav", "begin": 61.5, "end": 64.7,
+        "transcript": "the words of the segment"}
+
+Run it with --stub to get evenly spaced dummy timings without MFA installed.
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+import wave
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Alignment parameters of the acoustic model that the online aligner accepts
+ALIGN_OPTIONS = {"beam", "retry_beam", "transition_scale", "acoustic_scale",
+                 "self_loop_scale", "boost_silence"}
+
+
+def _wav_duration(audio_path):
+    """Return the duration of a WAV file in seconds"""
+    with wave.open(str(audio_path), mode='rb') as wav:
+        return wav.getnframes() / float(wav.getframerate())
+
+
+def _region(audio_path, begin, end):
+    """Return the (begin, end) seconds of a region, end defaulting to the end of the file"""
+    begin = float(begin or 0.0)
+    end = _wav_duration(audio_path) if end is None else float(end)
+    return begin, end
+
+
+class StubBackend:
+    """Backend that spreads the words evenly over the audio (no MFA needed)"""
+
+    name = "stub"
+
+    def __init__(self, dictionary_path=None, acoustic_model=None):
+        self.dictionary_path = dictionary_path
+        self.acoustic_model = acoustic_model
+
+    def align(self, audio_path, text, begin=0.0, end=None):
+        """Align text to audio
+
+        Args:
+            audio_path: Path to audio file
+            text: Transcript of the audio
+            begin: Start of the region to align in seconds (optional)
+            end: End of the region to align in seconds (optional, end of file)
+
+        Returns:
+            Dictionary with alignment results, times relative to begin
+        """
+        begin, end = _region(audio_path, begin, end)
+        duration = end - begin
+        words = text.split()
+        step = duration / len(words) if words else 0
+        result = {"words": [], "duration": duration}
+        for i, word in enumerate(words):
+            result["words"].append({
+                "word": word.lower(),
+                "start": i * step,
+                "end": (i + 1) * step
+            })
+        return result
+
+
+class MFABackend:
+    """Backend that keeps an MFA acoustic model and lexicon in memory (MFA >= 3.0)"""
+
+    name = "mfa"
+
+    def __init__(self, dictionary_path, acoustic_model):
+        # Imported here so that the stub backend works without MFA installed
+        from montreal_forced_aligner.command_line.utils import validate_model_arg
+        from montreal_forced_aligner.models import AcousticModel
+
+        logger.info(f"Loading acoustic model: {acoustic_model}")
+        self.acoustic_model = AcousticModel(validate_model_arg(acoustic_model, "acoustic"))
+
+        logger.info(f"Loading dictionary: {dictionary_path}")
+        self.lexicon_compiler = self.acoustic_model.lexicon_compiler
+        self.lexicon_compiler.load_pronunciations(Path(dictionary_path))
+        self.lexicon_compiler.create_fsts()
+
+        self.align_options = {
+            k: v for k, v in self.acoustic_model.parameters.items() if k in ALIGN_OPTIONS
+        }
+
+    def align(self, audio_path, text, begin=0.0, end=None):
+        """Align text to audio
+
+        Only the region is read from the file, so a segment of a long
+        recording is aligned without extracting it first.
+
+        Args:
+            audio_path: Path to audio file
+            text: Transcript of the audio
+            begin: Start of the region to align in seconds (optional)
+            end: End of the region to align in seconds (optional, end of file)
+
+        Returns:
+            Dictionary with alignment results, times relative to begin
+        """
+        from kalpy.feat.cmvn import CmvnComputer
+        from kalpy.utterance import Segment
+        from kalpy.utterance import Utterance as KalpyUtterance
+        from montreal_forced_aligner.online.alignment import align_utterance_online
+
+        begin, end = _region(audio_path, begin, end)
+        duration = end - begin
+        utterance = KalpyUtterance(Segment(str(audio_path), begin, end, 0), text)
+        utterance.generate_mfccs(self.acoustic_model.mfcc_computer)
+        cmvn = CmvnComputer().compute_cmvn_from_features([utterance.mfccs])
+        utterance.apply_cmvn(cmvn)
+
+        ctm = align_utterance_online(
+            self.acoustic_model, utterance, self.lexicon_compiler, **self.align_options
+        )
+
+        result = {"words": [], "duration": duration}
+        for interval in ctm.word_intervals:
+            if interval.label and interval.label != "<eps>":
+                result["words"].append({
+                    "word": interval.label.lower(),
+                    "start": interval.begin,
+                    "end": interval.end
+                })
+        return result
+
+
+BACKENDS = {
+    StubBackend.name: StubBackend,
+    MFABackend.name: MFABackend,
+}
+
+
+def serve(backend, instream=sys.stdin, outstream=sys.stdout):
+    """Answer alignment jobs from instream until it is closed
+
+    Args:
+        backend: Loaded alignment backend
+        instream: Stream with one JSON job per line
+        outstream: Stream the JSON responses are written to
+    """
+    for line in instream:
+        line = line.strip()
+        if not line:
+            continue
+        job = {}
+        try:
+            job = json.loads(line)
+            if "transcript" in job:
+                text = job["transcript"]
+            else:
+                with open(job["text"], 'r', encoding='utf-8') as f:
+                    text = f.read().replace('\n', ' ').strip()
+            result = backend.align(job["audio"], text, job.get("begin", 0.0), job.get("end"))
+            response = {"id": job.get("id"), "ok": True, "result": result}
+        except Exception as e:
+            logger.error(f"Error aligning job {job.get('id')}: {e}")
+            response = {"id": job.get("id"), "ok": False, "error": str(e)}
+        outstream.write(json.dumps(response) + '\n')
+        outstream.flush()
+
+
+class AlignmentWorker:
+    """Client for a worker process running this module"""
+
+    def __init__(self, dictionary_path, acoustic_model, backend="mfa"):
+        """Initialize the client
+
+        Args:
+            dictionary_path: Path to dictionary file
+            acoustic_model: Path or name of acoustic model
+            backend: Name of the worker backend ("mfa" or "stub")
+        """
+        self.dictionary_path = dictionary_path
+        self.acoustic_model = acoustic_model
+        self.backend = backend
+        self.process = None
+        self._responses = queue.Queue()
+        self._ready = False
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the worker process without waiting for the models to load"""
+        if self.is_alive():
+            return
+        cmd = [
+            sys.executable, os.path.abspath(__file__),
+            "--dictionary", str(self.dictionary_path),
+            "--acoustic-model", str(self.acoustic_model),
+            "--backend", self.backend,
+        ]
+        logger.info(f"Starting alignment worker: {' '.join(cmd)}")
+        # stderr is inherited so the worker's log ends up next to ours
+        self.process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1  # Line buffered
+        )
+        self._ready = False
+        self._responses = queue.Queue()
+        reader = threading.Thread(target=self._read_responses, args=(self.process,))
+        reader.daemon = True
+        reader.start()
+
+    def _read_responses(self, process):
+        """Move the worker's stdout lines onto the response queue"""
+        for line in process.stdout:
+            try:
+                self._responses.put(json.loads(line))
+            except ValueError:
+                logger.warning(f"Unexpected worker output: {line.strip()}")
+        # EOF: the worker has exited
+        self._responses.put(None)
+
+    def _get_response(self, timeout):
+        try:
+            response = self._responses.get(timeout=timeout)
+        except queue.Empty:
+            self.close()
+            raise RuntimeError(f"Alignment worker did not answer within {timeout} seconds")
+        if response is None:
+            raise RuntimeError("Alignment worker exited unexpectedly")
+        return response
+
+    def wait_ready(self, timeout=600):
+        """Block until the worker has loaded its models
+
+        Raises:
+            RuntimeError: If the worker fails to load or does not start in time
+        """
+        if self._ready:
+            return
+        if self.process is None:
+            raise RuntimeError("Alignment worker has not been started")
+        response = self._get_response(timeout)
+        if not response.get("ready"):
+            self.close()
+            raise RuntimeError(f"Alignment worker failed to start: {response.get('error')}")
+        self._ready = True
+        logger.info(f"Alignment worker ready (backend: {response.get('backend')})")
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def align(self, audio_path, text_path=None, timeout=1800, begin=None, end=None,
+              transcript=None):
+        """Align one segment in the worker
+
+        Args:
+            audio_path: Path to audio file
+            text_path: Path to text file (or give the transcript)
+            timeout: Maximum time in seconds to wait for the result
+            begin: Start of the region of audio_path to align in seconds (optional)
+            end: End of the region of audio_path to align in seconds (optional)
+            transcript: Normalized transcript, sent with the job instead of a file (optional)
+
+        Returns:
+            Dictionary with alignment results, times relative to begin
+        """
+        with self._lock:
+            self.wait_ready()
+            self._next_id += 1
+            job = {"id": self._next_id, "audio": str(audio_path)}
+            if transcript is not None:
+                job["transcript"] = transcript
+            else:
+                job["text"] = str(text_path)
+            if begin is not None:
+                job["begin"] = begin
+            if end is not None:
+                job["end"] = end
+            start = time.time()
+            try:
+                self.process.stdin.write(json.dumps(job) + '\n')
+                self.process.stdin.flush()
+            except (BrokenPipeError, OSError) as e:
+                raise RuntimeError(f"Alignment worker is not accepting jobs: {e}")
+            response = self._get_response(timeout)
+            if not response.get("ok"):
+                raise RuntimeError(response.get("error"))
+            logger.info(f"Worker aligned job {job['id']} in {time.time() - start:.2f}s")
+            return response["result"]
+
+    def close(self):
+        """Stop the worker process"""
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=5)
+        except Exception:
+            self.process.kill()
+        self.process = None
+        self._ready = False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Persistent MFA alignment worker")
+    parser.add_argument("--dictionary", required=True, help="Path to dictionary file")
+    parser.add_argument("--acoustic-model", required=True, help="Path or name of acoustic model")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="mfa")
+    parser.add_argument("--stub", action="store_const", const="stub", dest="backend",
+                        help="Use the stub backend (same as --backend stub)")
+    args = parser.parse_args(argv)
+
+    # stdout carries the protocol, so log to stderr
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    try:
+        backend = BACKENDS[args.backend](args.dictionary, args.acoustic_model)
+    except Exception as e:
+        logger.error(f"Could not load {args.backend} backend: {e}")
+        sys.stdout.write(json.dumps({"ready": False, "error": str(e)}) + '\n')
+        sys.stdout.flush()
+        return 1
+
+    sys.stdout.write(json.dumps({"ready": True, "backend": backend.name}) + '\n')
+    sys.stdout.flush()
+    serve(backend)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
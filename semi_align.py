@@ -4,7 +4,7 @@ Created on Fri Jul 24 21:26:31 2020
 
 @author: Sebastian Michelmann
 """
-#%% todo:-add zoom button, -add menu with save  aligner selection
+#%% todo: -add menu with save  aligner selection
 # note:
 # make color green for fixed text
 
@@ -27,66 +27,164 @@ Created on Fri Jul 24 21:26:31 2020
 
 open_with_files = False;
 
-#import time
 
-from mfa_aligner import SegmentAligner
+import time
+startup_time = time.perf_counter() # start of the startup timing probe
 # from segmentaligner import SegmentAligner
-import pyaudio
 #import struct
-import numpy as np
 import string
-import csv
+import re
+import difflib
+import sys
 
 #%% TRY THE PLOTTING PART
 import tkinter as tk
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+# the menu's dialogs must work before matplotlib (which used to import these) is loaded
+import tkinter.filedialog
+import tkinter.messagebox
 import os
-from matplotlib.figure import Figure
-from matplotlib.patches import Rectangle
 #from matplotlib.transforms import Bbox
 import threading
-import random
-import matplotlib
-matplotlib.use('TkAgg')
+import logging
+from tkinter import ttk
+
+logger = logging.getLogger(__name__)
+
+# the heavy modules (numpy, matplotlib, pyaudio and the aligner) and the audio
+# device are loaded in the background by preload() while the window is up
+np = None
+Figure = None
+FigureCanvasTkAgg = None
+Rectangle = None
+pyaudio = None
+audio_device = None
+AlignmentSession = None
+EnvelopePyramid = None
+MFAWrapper = None
+install_signal_handlers = None
+read_words_csv = None
+detect_speech = None
+preload_thread = None
+preload_error = None
+prewarm_thread = None
+tmpfolder = 'semi_files//data//tempalign'
 #%% NOTE: audio needs to be async!
 constructed = False
-time_axis = None
+session = None # AlignmentSession of the open files
+timebase = None
 fig = None
 fig2 = None
 canvas = None
 canvas2 = None
 step_width = None
 stream = None
+output_latency = 0 # seconds from the callback to the speaker
+refresh_job = None # pending playback refresh, None while idle
+render_time = 0.005 # smoothed duration of refresh() in seconds
+cursor_px = None # pixel column the playback cursor was last drawn at
+min_interval = 1/60 # fastest playback refresh in seconds
+max_interval = 0.25 # slowest playback refresh in seconds
 words_in_view = (0,-1)
 ax1 = None
 ax2 = None
-selection_A = 0
+word_ticks = None
+vad_regions = None # proposed speech regions, (start, end) in seconds
+vad_overlay = None
+listbox_rows = [] # rows currently shown in the listbox
+active_labels = {} # word label artists by word position
+label_pool = [] # hidden label artists for reuse
+label_x = 0 # cursor time the label colours were last set for
+text_tags = [] # Text widget tag of every word, by position
+tag_positions = {} # position of the word with a tag
+next_tag = 0
+text_dirty = False # the transcript was edited since the last update
+max_labels = 200 # more words than this in view are drawn as ticks
+min_scale = 0.25 # narrowest view in seconds
+redraw_pending = False
 last_list_sel = None
-root = tk.Tk()
+root = None
 bg = None
 #start_time = time.time()
-root.geometry('1000x550+50+50')
-root.title("SeMi-automatic aligner")
 
+textname = None
+audioname = None
+savefilename = None
+words_read = None
 
+def preload():
+    # import everything that is only needed once files are open, and open the audio device
+    global np, Figure, FigureCanvasTkAgg, Rectangle, pyaudio, audio_device
+    global AlignmentSession, EnvelopePyramid, MFAWrapper, install_signal_handlers, read_words_csv
+    global detect_speech, preload_error
+    t0 = time.perf_counter()
+    try:
+        import numpy as np
+        from mfa_aligner import MFAWrapper, install_signal_handlers, read_words_csv
+        from session import AlignmentSession
+        from waveform import EnvelopePyramid
+        from vad import detect_speech
+        import matplotlib
+        matplotlib.use('TkAgg')
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from matplotlib.figure import Figure
+        from matplotlib.patches import Rectangle
+        import pyaudio
+        audio_device = pyaudio.PyAudio()
+    except Exception as e:
+        preload_error = e
+        logger.error(f"Loading in the background failed: {e}")
+        return
+    logger.info(f"Loaded modules and audio device in the background in {1000*(time.perf_counter() - t0):.0f} ms")
 
-# #Icons made by <a href="https://www.flaticon.com/authors/skyclick" title="Skyclick">Skyclick</a> from <a href="https://www.flaticon.com/" title="Flaticon"> www.flaticon.com</a>
+def start_preload():
+    global preload_thread
+    preload_thread = threading.Thread(target=preload, name='preload')
+    preload_thread.daemon = True
+    preload_thread.start()
 
-#root.iconbitmap('semi_files//img//brain.ico')
+def wait_for_preload():
+    # called before the first use of a preloaded module; only waits if the user was faster
+    preload_thread.join()
+    if preload_error is not None:
+        raise RuntimeError(f"Could not load the aligner: {preload_error}")
 
-root.tk.call('wm', 'iconphoto', root._w, tk.PhotoImage(file= 'semi_files//img//brain.png'))
+def prewarm_models():
+    # validate the MFA models as soon as the first file is chosen, so the first align does not wait
+    global prewarm_thread
+    if prewarm_thread is not None:
+        return
+    def run():
+        try:
+            wait_for_preload()
+        except RuntimeError:
+            return
+        # only the model registry is needed; the wrapper's workspace goes straight
+        # back to the pool, where the session's aligner picks it up
+        mfa = MFAWrapper(temp_path = tmpfolder)
+        try:
+            mfa.prewarm().join()
+        finally:
+            mfa.close()
+    prewarm_thread = threading.Thread(target=run, name='prewarm')
+    prewarm_thread.daemon = True
+    prewarm_thread.start()
 
-root.configure(background= 'white')
+def report_startup():
+    # time to first interaction: the window is drawn and handles input
+    logger.info(f"Window ready {1000*(time.perf_counter() - startup_time):.0f} ms after start")
+    if '--startup-probe' in sys.argv:
+        # measure until everything is loaded, then quit
+        wait_for_preload()
+        logger.info(f"Fully loaded {1000*(time.perf_counter() - startup_time):.0f} ms after start")
+        root.destroy()
 
-textname = None
-audioname = None
-savefilename = None
-words_read = None
 def openTfile():
     global textname
     textname =  tk.filedialog.askopenfilename(
         initialdir = os.getcwd() + '\\semi_files\\data',title = "Select file",filetypes = (
             ("txt files","*.txt"),("all files","*.*")))
+    if textname:
+        prewarm_models()
     if audioname:
         fileMenuItems.entryconfig("Open .txt", state="disabled")
         fileMenuItems.entryconfig("Open .wav", state="disabled")
@@ -103,6 +201,8 @@ def openWfile():
     audioname =  tk.filedialog.askopenfilename(
         initialdir = os.getcwd() + '\\semi_files\\data',title = "Select file",filetypes = (
             ("txt files","*.wav"),("all files","*.*")))
+    if audioname:
+        prewarm_models()
     if textname:
         fileMenuItems.entryconfig("Open .txt", state="disabled")
         fileMenuItems.entryconfig("Open .wav", state="disabled")
@@ -124,40 +224,22 @@ def savefile():
     if not(savefilename):
         asksavefile()
     else:
-        with open(savefilename, 'w', newline='') as csvfile:            
-            cswrriter = csv.writer(csvfile)
-            for ww in sa.all_aligned_words:
-                if ww[3]:
-                    cswrriter.writerow([ww[0], ww[1], "{:.5f}".format(
-                            float(ww[2])), "{:.5f}".format(float(ww[3]))])
-                else: 
-                    cswrriter.writerow([ww[0], ww[1], "NaN", "NaN"])
+        session.save_csv(savefilename)
 
 def loadfile():
     global words_read
-    words_read = []
     files = [('Csv Files', '*.csv'),]
     loadfilename = tk.filedialog.askopenfilename(initialdir = os.getcwd() + '\\semi_files\\data', title = "Select file", filetypes = files)
-    
-    with open(loadfilename, newline='') as csvfile:
-        cwreader = csv.reader(csvfile, delimiter=' ', quotechar='|')
-        for row in cwreader:
-            word = row[0].split(sep = ',')
-            if word[3]== 'NaN':
-                words_read.append((word[0], word[1], None, None))
-            else:
-                #print(word)
-                words_read.append(
-                    (word[0], word[1], float(word[2]), float(word[3])))
+    if not loadfilename:
+        return
+    wait_for_preload()
+    words_read = read_words_csv(loadfilename)
     if constructed:
-        for ii in range(len(words_read)):
-            if (words_read[ii][0] == sa.all_aligned_words[ii][0]) and (
-                    words_read[ii][1] == sa.all_aligned_words[ii][1]):
-                sa.all_aligned_words[ii] = words_read[ii]
-            else:          
-                tk.messagebox.showerror(
-                    title=None, message='there is a mismatch between the words')
-                return
+        try:
+            session.merge_words(words_read)
+        except ValueError as e:
+            tk.messagebox.showerror(title=None, message=str(e))
+            return
         fill_listbox() 
         draw_words()          
 def close():
@@ -167,46 +249,50 @@ def close():
         return      
     else: 
         root.destroy()
-menuBar = tk.Menu(root)
-fileMenuItems = tk.Menu(menuBar)
-fileMenuItems.add_command(label="Open .txt", command=openTfile)
-fileMenuItems.add_command(label="Open .wav", command=openWfile)
-fileMenuItems.add_command(label="Save", command=savefile)
-fileMenuItems.add_command(label="Save As", command=asksavefile)
-fileMenuItems.add_command(label="Load", command=loadfile)
-fileMenuItems.add_command(label="Close", command=close)
-
-fileMenuItems.entryconfig("Save", state="disabled")
-fileMenuItems.entryconfig("Save As", state="disabled")
-
 
-menuBar.add_cascade(label="File", menu=fileMenuItems)
-root.config(menu=menuBar)
+def build_menu():
+    global menuBar, fileMenuItems
+    menuBar = tk.Menu(root)
+    fileMenuItems = tk.Menu(menuBar)
+    fileMenuItems.add_command(label="Open .txt", command=openTfile)
+    fileMenuItems.add_command(label="Open .wav", command=openWfile)
+    fileMenuItems.add_command(label="Save", command=savefile)
+    fileMenuItems.add_command(label="Save As", command=asksavefile)
+    fileMenuItems.add_command(label="Load", command=loadfile)
+    fileMenuItems.add_command(label="Close", command=close)
+    
+    fileMenuItems.entryconfig("Save", state="disabled")
+    fileMenuItems.entryconfig("Save As", state="disabled")
+    
+    
+    menuBar.add_cascade(label="File", menu=fileMenuItems)
+    root.config(menu=menuBar)
 
 
 
 
 def add_elements():
-    global sa, playing, segment_playing, txt, my_thread, listbox, selection_A, ax1, ax2, bg
-    global selection_B, left_select, right_select, max_wpm, x_scale, words_inwin
+    global session, playing, segment_playing, txt, my_thread, listbox, ax1, ax2, bg
+    global max_wpm, x_scale, words_inwin
     global words_inwin, left_sel, audiopos, zoom_in, constructed
-    global time_axis, fig, fig2, canvas, canvas2, step_width, stream
-    
+    global timebase, fig, fig2, canvas, canvas2, step_width, stream, output_latency
+    global progressbar, progresslabel, pyramid, waveform_line, listbox_rows
+    global active_labels, label_pool
+    
+    files_chosen = time.perf_counter()
+    wait_for_preload()
+    # the aligner's temporary files are removed when the process is terminated
+    install_signal_handlers()
     constructed = True
     
     #audioname = 'semi_files//data//grav1.wav'
     #textname = 'semi_files//data//grav1.txt'
-    tmpfolder = 'semi_files//data//tempalign'
-    sa = SegmentAligner(audioname, textname, tmpfolder)
-    #%% read all the data
-    n_frames = sa.audio.getnframes()
-    sr = sa.audio.getframerate()
-    time_axis = np.arange(0, n_frames/sr, 1/sr);
-    
-    sa.audio.setpos(sa.audio_sel[0])
-    #struct.unpack(str(2*n_frames) + 'B', sa.audio.readframes(n_frames))
-    data_all = np.frombuffer(sa.audio.readframes(n_frames),dtype=np.int16)
-    sa.audio.setpos(sa.audio_sel[0])
+    # the session owns words, audio, selection and aligner; the widgets below are views of it
+    session = AlignmentSession(audioname, textname, tmpfolder, use_worker=True)
+    #%% map the data (samples are only read from disk when they are plotted)
+    sr = session.source.sr
+    timebase = session.timebase
+    data_all = session.source.channel(0)
     
     
     playing = False
@@ -214,14 +300,13 @@ def add_elements():
     txt = None
     my_thread = None
     listbox = None
-    selection_A = 0
-    selection_B = time_axis[-1]
-    left_select = False
-    right_select = False
+    listbox_rows = []
+    active_labels = {}
+    label_pool = []
     max_wpm = 400 # 200 is realistic
-    x_scale = 20
+    x_scale = 20 # width of the view in seconds, changed by zooming
     words_inwin = round(x_scale*(max_wpm/60))
-    step_width = 5
+    step_width = x_scale/4
     left_sel = 0
     audiopos = 0
     zoom_in = 1
@@ -236,9 +321,13 @@ def add_elements():
     
     
     ax1 = fig.gca()
-    ax1.plot(time_axis[0:-1:200], data_all[0:-1:200],'-', color = 'dimgray', lw = 0.5)
+    # min/max envelopes, only the level and slice matching the view are plotted
+    pyramid = EnvelopePyramid(data_all, sr)
+    waveform_line, = ax1.plot([], [],'-', color = 'dimgray', lw = 0.5)
+    ax1.set_ylim(pyramid.limits)
     ax1.get_yaxis().set_ticks([])
     ax1.set_xlim([0,x_scale]) # this works in audio, if pos> half of time a
+    update_waveform()
     
    # ax1.text(1, 0,"test",  fontsize = 6, bbox=dict(pad = 0, facecolor='red', lw = 0 ), animated=False)
   
@@ -247,8 +336,8 @@ def add_elements():
    # fig.tight_layout()
     
     fig.tight_layout(pad=0.01, w_pad=0.01, h_pad=0.01)
-    fig.add_subplot(212).plot(time_axis, np.empty((len(time_axis),1))
-                               , color = 'dimgray', lw = 0.2)
+    # the lower axes only hold the word labels
+    fig.add_subplot(212)
    
     ax2 = fig.gca()
     ax2.get_yaxis().set_ticks([])
@@ -289,16 +378,23 @@ def add_elements():
    #frame_count = 1024
     
     
-    p = pyaudio.PyAudio()
-    
-    stream = p.open(format = p.get_format_from_width(sa.audio.getsampwidth()),
-                    channels = sa.audio.getnchannels(),
-                    rate = sa.audio.getframerate(),
+    # the device was opened in the background by preload()
+    # float WAVs have the width of 32 bit PCM, so their format is set explicitly
+    if session.source.is_float:
+        sample_format = pyaudio.paFloat32
+    else:
+        sample_format = pyaudio.get_format_from_width(session.source.sampwidth)
+    stream = audio_device.open(format = sample_format,
+                    channels = session.source.n_channels,
+                    rate = session.source.sr,
                     output = True, stream_callback = callback, start = False)
+    output_latency = stream.get_output_latency()
 
 
     
     canvas.mpl_connect('button_press_event', onclick)
+    canvas.mpl_connect('scroll_event', onscroll)
+    canvas.mpl_connect('key_press_event', onkey)
     
     align_button = tk.Button(root, text = "align", command = align)
     align_button.place(x = 850, y = 505, width=150, height=25)
@@ -308,6 +404,11 @@ def add_elements():
     txt_update_button = tk.Button(root, text = 'update', command = txt_update)
     txt_update_button.place(x = 0, y = 505, width=50, height=25)
     
+    progressbar = ttk.Progressbar(root, mode = 'determinate', maximum = 100)
+    progressbar.place(x = 220, y = 5, width=300, height=20)
+    progresslabel = tk.Label(root, text = '', bg = 'white', anchor = 'w')
+    progresslabel.place(x = 530, y = 5, width=320, height=20)
+    
    
     
     txt = tk.Text(root, wrap = tk.WORD, bg = 'grey12', fg = 'gold', 
@@ -323,6 +424,7 @@ def add_elements():
     txt['yscrollcommand'] = scroll.set
     
     txt.place(x = 0, y = 270, width=850, height=240)
+    watch_text_edits(txt)
     
     add_text()
     
@@ -331,13 +433,13 @@ def add_elements():
     
     #text['yscrollcommand'] = scrollbar1.set
     
-    #word_axis = np.arange(1/sr, len(time_axis)-1/sr, len(sa.all_aligned_words))
+    #word_axis = np.arange(1/sr, len(time_axis)-1/sr, len(session.words))
     
     
     
         
     #txt.tag_config(word[0], background="yellow", foreground="red")
-    #for word in sa.all_aligned_words: 
+    #for word in session.words: 
     #print(txt.index('testtag'))
         #print(txt.get("1.0","end" ))
         #print(txt.get("%d.%d" % (1, 3),"%d.%d" % (1, 8)))
@@ -372,104 +474,189 @@ def add_elements():
     scrollbar.config(command = listbox.yview) 
     
     if words_read:
-        for ii in range(len(words_read)):
-                if (words_read[ii][0] == sa.all_aligned_words[ii][0]) and (
-                        words_read[ii][1] == sa.all_aligned_words[ii][1]):
-                    sa.all_aligned_words[ii] = words_read[ii]
+        session.merge_words(words_read, strict = False)
         fill_listbox() 
-        draw_words()          
-    
-    bg = canvas.copy_from_bbox(ax1.bbox)
+    draw_words()
+    start_vad(data_all, sr)
+    logger.info(f"Interface ready {1000*(time.perf_counter() - files_chosen):.0f} ms after the files were chosen")
 
 
 
 def add_text():
-    global listbox
-   
-    ls = None
- 
-    
+    global text_tags, tag_positions, text_dirty
     txt.delete('1.0', 'end')
-    ii = 0
-    for word in sa.all_aligned_words: 
-          
-        txt.insert('end', word[1], word[0])
-        txt.insert('end', ' ')
-        
-        if last_list_sel:
-            ls = max(last_list_sel)
-            if ls >= ii:
-                txt.tag_config(word[0], background="SeaGreen3")
-            else:
-                txt.tag_config(word[0], background='grey12')
-        
-        
-        # if listbox and list_sel[1] > ii:
-        #     txt.tag_config(word[0], background="red")
-        ii += 1
-    if ls:
+    if text_tags:
+        txt.tag_delete(*text_tags)
+    text_tags = [new_tag() for word in session.words]
+    tag_positions = {tag: ii for ii, tag in enumerate(text_tags)}
+    # one insert for the whole transcript: word, tags, space, no tags, ...
+    chunks = []
+    for word, tag in zip(session.words, text_tags):
+        chunks += [word[1], (tag, 'word'), ' ', ()]
+    if chunks:
+        txt.insert('end', *chunks)
+    txt.tag_config('done', background="SeaGreen3")
+    text_dirty = False
+    highlight_done()
+
+def highlight_done():
+    # mark the transcript in green up to the last word selected in the listbox
+    txt.tag_remove('done', '1.0', 'end')
+    if not last_list_sel:
+        return
+    ls = max(last_list_sel)
+    if ls < len(text_tags):
+        ranges = txt.tag_ranges(text_tags[ls])
+        if ranges:
+            txt.tag_add('done', '1.0', ranges[-1])
+    else:
+        txt.tag_add('done', '1.0', 'end')
+    if ls and listbox:
         listbox.selection_set( min(listbox.size()-1, ls))
         listbox.see(ls)
+
+def new_tag():
+    global next_tag
+    next_tag += 1
+    return 't' + str(next_tag)
+
+def watch_text_edits(widget):
+    # route the widget's insert/delete through mark_dirty, so txt_update
+    # only has to look at the region that was edited
+    orig = widget._w + '_orig'
+    widget.tk.call('rename', widget._w, orig)
+    def proxy(*args):
+        if len(args) > 1 and args[0] in ('insert', 'delete', 'replace'):
+            try:
+                mark_dirty(widget.tk.call(orig, 'index', args[1]))
+            except tk.TclError:
+                pass
+        return widget.tk.call((orig,) + args)
+    widget.tk.createcommand(widget._w, proxy)
+
+def mark_dirty(index):
+    # the marks move with the text: dirty_start stays before an insertion
+    # at its position, dirty_end moves behind it
+    global text_dirty
+    if not text_dirty:
+        txt.mark_set('dirty_start', index)
+        txt.mark_gravity('dirty_start', 'left')
+        txt.mark_set('dirty_end', index)
+        txt.mark_gravity('dirty_end', 'right')
+        text_dirty = True
+    elif txt.compare(index, '<', 'dirty_start'):
+        txt.mark_set('dirty_start', index)
+    elif txt.compare(index, '>', 'dirty_end'):
+        txt.mark_set('dirty_end', index)
     
 def align():
     if not constructed:
         return
-    global listbox, selection_A, selection_B
+    global listbox
     list_sel = listbox.curselection()
     if not list_sel:
         tk.messagebox.showerror(title=None, message='no words selected')
         return
-    if selection_A == 0 and selection_B == time_axis[-1]:
+    if session.selection == (0, timebase.end):
         MsgBox  = tk.messagebox.askquestion(title = None,
                                             message='select all audio?')
         if MsgBox == 'no':
             return
-    elif not(left_select) and not(right_select):
+    elif not(session.left_select) and not(session.right_select):
         MsgBox  = tk.messagebox.askquestion(title = 'selection missing',
                                             message='select all audio?')
         if MsgBox == 'no':
             return
-    elif not(left_select):
+    elif not(session.left_select):
         MsgBox  = tk.messagebox.askquestion(title = 'selection missing',
                                             message='select from beginning?')
         if MsgBox == 'no':
             return
-    elif not(right_select):
+    elif not(session.right_select):
         MsgBox  = tk.messagebox.askquestion(title = 'selection missing',
                                             message='select until end?')
         if MsgBox == 'no':
             return
-    audio_sel = (selection_A, selection_B)
+    audio_sel = session.selection
     word_sel = (int(list_sel[0]),int(list_sel[-1]+1))
    
-    sa.align_segment(audio_sel, word_sel)
+    # the aligner runs in the background, so the next words can be selected right away
+    submit_alignment(audio_sel, word_sel)
    
-    fill_listbox()
-    draw_words()
+    listbox.selection_clear(0, 'end')
     listbox.selection_set( min(listbox.size()-1, list_sel[-1]+1))
     listbox.see(list_sel[-1])
     #min(listbox.size()-1, list_sel[-1]+1)
 
+# -- background alignment: the session aligns jobs one after another in a worker
+# thread, results are merged on the tk main thread via root.after
+def submit_alignment(audio_sel, word_sel):
+    def progress(fraction, message):
+        root.after(0, show_progress, fraction, message)
+    def done(word_sel, words, words_id, error):
+        root.after(0, merge_alignment, word_sel, words, words_id, error)
+    session.submit_alignment(word_sel, done, audio_sel, progress)
+    show_progress(0, 'queued')
+
+def merge_alignment(word_sel, words, words_id, error):
+    if error:
+        show_progress(0, 'alignment failed')
+        tk.messagebox.showerror(title=None, message='alignment failed: ' + error)
+        return
+    if not session.merge_alignment(word_sel, words, words_id):
+        # the transcript was edited while aligning
+        show_progress(0, 'words changed, alignment discarded')
+        return
+    show_progress(1, 'done')
+    fill_listbox(word_sel[0], word_sel[1])
+    draw_words()
+    
+def show_progress(fraction, message):
+    progressbar['value'] = 100*fraction
+    if session.jobs_pending > 1:
+        message += ' (' + str(session.jobs_pending - 1) + ' queued)'
+    progresslabel.config(text = message)
+
 def callback(in_data, frame_count, time_info, status):
     #global audiopos
     #audiopos +=1024
-    data = sa.audio.readframes(frame_count)
+    # stream time at which this buffer will be heard, for a cursor that follows the sound
+    output_time = time_info.get('output_buffer_dac_time')
+    if not output_time and time_info.get('current_time'):
+        output_time = time_info['current_time'] + output_latency
+    data, finished = session.playhead.read(frame_count, output_time)
+    if finished:
+        # the end of the segment (or file) is played out exactly; tell the GUI
+        # from another thread, the audio thread must not wait for Tk
+        threading.Thread(target = root.event_generate, args = ('<<PlaybackDone>>',),
+                         kwargs = {'when': 'tail'}, daemon = True).start()
+        return (data, pyaudio.paComplete)
     return (data, pyaudio.paContinue)   
 
+def play_position():
+    # the frame that is heard right now while playing, else the playhead
+    if playing:
+        return session.playhead.audible_frame(stream.get_time())
+    return session.playhead.tell()
+
+def on_playback_done(event = None):
+    if not playing:
+        return
+    refresh()
+    pause_audio()
+
 def doubleright_step():
     if not constructed:
         return
     if playing or segment_playing:
         return
-    global  sa #,words_in_view
+    #global words_in_view
 
     xl = ax1.get_xlim()
-    if (xl[1]+10*step_width)<time_axis[-1]:
-        ax1.set_xlim((xl[0]+10*step_width, xl[1]+10*step_width))
-        ax2.set_xlim((xl[0]+10*step_width, xl[1]+10*step_width))
+    if (xl[1]+10*step_width)<timebase.end:
+        set_view((xl[0]+10*step_width, xl[1]+10*step_width))
     else:
-        ax1.set_xlim((time_axis[-1]-x_scale), time_axis[-1])
-        ax2.set_xlim((time_axis[-1]-x_scale, time_axis[-1]))
+        set_view((timebase.end-x_scale, timebase.end))
     
     # new
     line = ax1.get_lines()
@@ -483,55 +670,288 @@ def doubleright_step():
         patches[0].remove()
     draw_words()
 
+def set_view(lim):
+    ax1.set_xlim(lim)
+    ax2.set_xlim(lim)
+    update_waveform()
+
+def update_waveform():
+    lim = ax1.get_xlim()
+    # about two envelope buckets per pixel
+    max_points = 2*int(ax1.bbox.width) or 2000
+    x, y = pyramid.envelope(lim[0], lim[1], max_points)
+    waveform_line.set_data(x, y)
+
+# -- zooming: mouse wheel over the audio, or +/-/0 keys when the plot has focus
+def zoom(factor, center = None):
+    global x_scale, step_width
+    if not constructed:
+        return
+    xl = ax1.get_xlim()
+    if center is None:
+        center = (xl[0]+xl[1])/2
+    new_scale = min(max(x_scale*factor, min_scale), timebase.end)
+    # keep the point under the mouse in place
+    rel = (center-xl[0])/(xl[1]-xl[0])
+    left = min(max(center - rel*new_scale, 0), timebase.end - new_scale)
+    x_scale = new_scale
+    step_width = x_scale/4
+    set_view((left, left+x_scale))
+    request_redraw()
+
+def request_redraw():
+    # draw once for a burst of wheel events
+    global redraw_pending
+    if not redraw_pending:
+        redraw_pending = True
+        root.after_idle(redraw)
+
+def redraw():
+    global redraw_pending
+    redraw_pending = False
+    draw_words()
+
+def onscroll(event):
+    if event.inaxes is None:
+        return
+    if event.button == 'up':
+        zoom(1/1.25, event.xdata)
+    elif event.button == 'down':
+        zoom(1.25, event.xdata)
+
+def onkey(event):
+    if event.key in ('+', '='):
+        zoom(1/1.5)
+    elif event.key == '-':
+        zoom(1.5)
+    elif event.key == '0':
+        zoom(timebase.end/x_scale)
+    elif event.key == 'left':
+        left_step()
+    elif event.key == 'right':
+        right_step()
+    elif event.key == 'v':
+        accept_proposal()
+
+# -- proposed segments: speech regions are found in the background and shaded on
+# the audio; 'v' selects the one at (or after) the cursor, as a left and a right click would
+def start_vad(data, sr):
+    def run():
+        try:
+            regions = detect_speech(data, sr)
+        except Exception as e:
+            logger.error(f"Voice activity detection failed: {e}")
+            return
+        root.after(0, show_proposals, regions)
+    vad_thread = threading.Thread(target=run, name='vad')
+    vad_thread.daemon = True
+    vad_thread.start()
+
+def show_proposals(regions):
+    global vad_regions, vad_overlay
+    vad_regions = regions
+    if vad_overlay is not None:
+        vad_overlay.remove()
+    # full height of the axes, behind the waveform
+    vad_overlay = ax1.broken_barh([(start, end - start) for start, end in regions], (0, 1),
+                                  transform = ax1.get_xaxis_transform(),
+                                  facecolors = 'gold', alpha = 0.2, lw = 0, zorder = 0)
+    logger.info(f"{len(regions)} speech regions proposed")
+    draw_canvas()
+
+def accept_proposal():
+    if not constructed or vad_regions is None or not len(vad_regions):
+        return
+    if segment_playing:
+        pause_audio()
+    # after accepting a region the cursor stands on its last frame, so the next press takes the next one
+    x = timebase.to_time(play_position()) + 1.5/timebase.sr
+    i = np.searchsorted(vad_regions[:, 1], x, side = 'right')
+    if i == len(vad_regions):
+        return
+    start, end = vad_regions[i]
+    session.select_left(start)
+    session.select_right(min(end, timebase.end))
+    
+    # bring the region into view
+    xl = ax1.get_xlim()
+    if start < xl[0] or session.selection_B > xl[1]:
+        left = min(max(start - x_scale/8, 0), max(timebase.end - x_scale, 0))
+        set_view((left, left + x_scale))
+    draw_selection()
+    color_labels(session.selection_B)
+    draw_words()
+
+def draw_selection():
+    # the lines and the patch of a left and a right click
+    line = ax1.get_lines()
+    while len(line)>1:
+        line[1].remove()
+        line = ax1.get_lines()
+    patches = ax1.patches
+    if patches:
+        patches[0].remove()
+    ax1.axvline(x=session.selection_A, color = 'crimson', lw = 0.5)
+    ytupel =ax1.get_ylim()
+    ax1.add_patch(Rectangle((session.selection_A, ytupel[0]), 
+                            session.selection_B - session.selection_A, ytupel[1]-ytupel[0], 
+                            fc ='cornflowerblue',  
+                            ec ='cornflowerblue', 
+                            lw = 0, 
+                            alpha=0.25) ) 
+    ax1.axvline(x=session.selection_B, color = 'royalblue', lw = 0.5)
+
 # radical change: only draw if words_in_view, then update in refresh (add draw_words)
 def draw_words():
-    global ax1, ax2 #,words_in_view
-    sign = +1
-    if ax2.texts:
-       # Replaced this line:
-       # while len(ax2.texts)>0:
-       #     del(ax2.texts[-1])
-       # With this:
-       for text in ax2.texts[:]:
-           text.remove()
-    
-    at = sa.audio.tell()
-    lim = ax1.get_xlim()    
-    # words_in_view = []
-    #i = 0
-    for word in sa.all_aligned_words:
-        jit = sign*(random.random())/2
-        if word[2] and (lim[0]-1< word[2] and lim[1]+1> word[2]):
-            
-            if time_axis[at] < word[2]:
-                ax2.text(word[2],0.45+jit,word[1], fontsize = 8,
-                                bbox=dict(pad = 0, facecolor='red', lw = 0
-                                         ))
-            else:
-                ax2.text(word[2],0.45+jit,word[1], fontsize = 8,
-                                bbox=dict(pad = 0, facecolor='green', lw = 0
-                                          )) # , alpha=0.5)  
-            sign *= -1
-            # if lim[0]-1< word[2] and lim[1]+1> word[2]:
-            #     words_in_view.append(i)
-            #i +=1
-          
-    canvas.draw() 
+    place_labels()
+    draw_canvas()
+
+def draw_canvas():
+    # full redraw of everything but the (animated) labels, which are blitted on top
+    # and stay in the canvas buffer until the next full redraw
+    global bg, cursor_px
+    cursor_px = None
+    canvas.draw()
+    bg = canvas.copy_from_bbox(ax1.bbox)
+    draw_labels()
+    canvas.blit()
+
+def draw_labels():
+    for label in active_labels.values():
+        ax2.draw_artist(label)
+
+def label_y(pos):
+    # deterministic jitter: alternate above and below the middle, spread by the golden ratio
+    sign = 1 if pos % 2 == 0 else -1
+    return 0.45 + sign*((pos*0.6180339887) % 1)/2
+
+def new_label():
+    return ax2.text(0, 0, '', fontsize = 8, animated = True,
+                    bbox=dict(pad = 0, facecolor='red', lw = 0))
+
+def place_labels():
+    # show a label for every word in view, recycling the labels of words that left it
+    global word_ticks, label_x
+    if word_ticks:
+        word_ticks.remove()
+        word_ticks = None
+    
+    lim = ax1.get_xlim()
+    visible = session.words.in_window(lim[0]-1, lim[1]+1)
+    # level of detail: when zoomed out too far for readable labels, mark the onsets only
+    if len(visible) > max_labels:
+        word_ticks = ax2.vlines(session.words.starts[visible], 0.2, 0.8,
+                                color = 'dimgray', lw = 0.5)
+        visible = []
+    visible = set(int(pos) for pos in visible)
+    for pos in list(active_labels):
+        if pos not in visible:
+            label = active_labels.pop(pos)
+            label.set_visible(False)
+            label_pool.append(label)
+    
+    x = timebase.to_time(play_position())
+    label_x = x
+    for pos in visible:
+        word = session.words[pos]
+        label = active_labels.get(pos)
+        if label is None:
+            label = label_pool.pop() if label_pool else new_label()
+            label.set_visible(True)
+            active_labels[pos] = label
+        # words move or change when the transcript is edited or realigned
+        if label.get_text() != word[1]:
+            label.set_text(word[1])
+        xy = (word[2], label_y(pos))
+        if label.get_position() != xy:
+            label.set_position(xy)
+        label.get_bbox_patch().set_facecolor('green' if word[2] <= x else 'red')
+
+def color_labels(x):
+    # green for words before the cursor, red for words after it
+    global label_x
+    label_x = x
+    for label in active_labels.values():
+        label.get_bbox_patch().set_facecolor('green' if label.get_position()[0] <= x else 'red')
+
+def color_crossed_labels(x):
+    # only the labels whose onset lies between the last and the current cursor
+    # position change colour; returns them for redrawing
+    global label_x
+    lo, hi = min(label_x, x), max(label_x, x)
+    label_x = x
+    crossed = []
+    if lo == hi:
+        return crossed
+    for pos in session.words.in_window(lo, np.nextafter(hi, np.inf)):
+        label = active_labels.get(int(pos))
+        if label is not None:
+            label.get_bbox_patch().set_facecolor('green' if label.get_position()[0] <= x else 'red')
+            crossed.append(label)
+    return crossed
+    
+def listbox_row(word):
+    if word[3]:
+        return (word[0], word[1], "{:.3f}".format(
+            float(word[2])), "{:.3f}".format(float(word[3])))
+    return word
+
+def fill_listbox(start=0, stop=None):
+    # bring the listbox up to date with session.words[start:stop] (stop None: to the end)
+    # only the rows that differ are replaced, so the selection and scroll position are kept
+    global listbox, listbox_rows
+    if not listbox:
+        return
+    if stop is None:
+        new_rows = listbox_rows[:start] + [listbox_row(word) for word in session.words[start:]]
+    else:
+        new_rows = (listbox_rows[:start] + [listbox_row(word) for word in session.words[start:stop]]
+                    + listbox_rows[stop:])
+    old_rows = listbox_rows
+    
+    # the rows between a common head and tail are the ones that changed
+    n = min(len(old_rows), len(new_rows))
+    head = min(start, n)
+    while head < n and old_rows[head] == new_rows[head]:
+        head += 1
+    tail = 0
+    while tail < n - head and old_rows[-1-tail] == new_rows[-1-tail]:
+        tail += 1
+    old_end = len(old_rows) - tail
+    new_end = len(new_rows) - tail
+    if head == old_end and head == new_end:
+        return
     
-    #canvas.flush_events()      
-def fill_listbox():
-    global listbox
-    if listbox:
-        listbox.delete(0,'end')
-    # Insert elements into the listbox 
-    for word in sa.all_aligned_words: 
-        if word[3]:
-            tp = (word[0], word[1], "{:.3f}".format(
-                float(word[2])), "{:.3f}".format(float(word[3])))
-            listbox.insert(tk.END, tp)
-        else: 
-            listbox.insert(tk.END, word)
-    #listbox.pack()
+    list_sel = listbox.curselection()
+    yview = listbox.yview()
+    if old_end == new_end:
+        # same number of rows: replace runs of changed rows
+        ii = head
+        while ii < new_end:
+            if old_rows[ii] == new_rows[ii]:
+                ii += 1
+                continue
+            jj = ii
+            while jj < new_end and old_rows[jj] != new_rows[jj]:
+                jj += 1
+            listbox.delete(ii, jj-1)
+            listbox.insert(ii, *new_rows[ii:jj])
+            ii = jj
+    else:
+        if old_end > head:
+            listbox.delete(head, old_end-1)
+        if new_end > head:
+            listbox.insert(head, *new_rows[head:new_end])
+    listbox_rows = new_rows
+    
+    # replaced rows lose their selection, rows after them may have moved
+    for ii in list_sel:
+        if ii >= old_end:
+            ii += new_end - old_end
+        elif ii >= new_end:
+            continue
+        listbox.selection_set(ii)
+    listbox.yview_moveto(yview[0])
   
 # -- define the onclick function for the figure canvas:
 def left_step():
@@ -539,15 +959,13 @@ def left_step():
         return
     if playing or segment_playing:
         return
-    global sa, ax1, ax2 #words_in_view
+    global ax1, ax2 #words_in_view
     
     xl = ax1.get_xlim()
     if (xl[0]-step_width)>=0:
-        ax1.set_xlim((xl[0]-step_width, xl[1]-step_width))
-        ax2.set_xlim((xl[0]-step_width, xl[1]-step_width))
+        set_view((xl[0]-step_width, xl[1]-step_width))
     else:
-        ax1.set_xlim((0, x_scale))
-        ax2.set_xlim((0, x_scale))
+        set_view((0, x_scale))
     
     # new
     line = ax1.get_lines()
@@ -564,7 +982,7 @@ def left_step():
     draw_words() # will also draw the canvas
     # i = 0
     # words_in_view = []
-    # for word in sa.all_aligned_words:
+    # for word in session.words:
     #     if word[2]:                    
     #         if xl[0]-1< word[2] and xl[1]+1> word[2]:
     #             words_in_view.append(i)
@@ -578,26 +996,18 @@ def onclick(event):
     # print('%s click: button=%d, x=%d, y=%d, xdata=%f, ydata=%f' %
     #       ('double' if event.dblclick else 'single', event.button,
     #        event.x, event.y, event.xdata, event.ydata))
-    global right_select, selection_B
     # LEFT CLICK EVENT
+    canvas.get_tk_widget().focus_set()
     if segment_playing:
         pause_audio()
     if event.button==1:
-        global selection_A, left_select
-        
         #get data
         x = event.xdata
         if not([x]):
             return
         
-        selection_A = x
-        selection_B = time_axis[-1]
-        left_select = True
-        right_select = False
-        # set audio
-        idcs = np.where(time_axis<selection_A)
-        ps = idcs[0][-1]
-        sa.audio.setpos(ps)
+        # select from here (and play from here)
+        session.select_left(x)
         
         # popping the 2nd line
         line = ax1.get_lines()
@@ -612,23 +1022,18 @@ def onclick(event):
         if patches:
             patches[0].remove()
              
-        # if (x+x_scale/2)<time_axis[-1] and (x-x_scale/2)>0:
+        # if (x+x_scale/2)<timebase.end and (x-x_scale/2)>0:
         #     fig.gca().set_xlim((x-x_scale/2), 
         #                        (x+x_scale/2))
         # elif x < x_scale:
         #     fig.gca().set_xlim((0, 
         #                        x_scale))
-        # elif x > (time_axis[-1] -x_scale):
-        #     fig.gca().set_xlim((time_axis[-1] -x_scale, 
-        #                        time_axis[-1]))
+        # elif x > (timebase.end -x_scale):
+        #     fig.gca().set_xlim((timebase.end -x_scale, 
+        #                        timebase.end))
             
         # also update the text box:
-        for tt in ax2.texts:
-            coor = tt.get_position()
-            if coor[0] <= x:
-                tt.get_bbox_patch().set_facecolor('green')
-            else:
-                tt.get_bbox_patch().set_facecolor('red')
+        color_labels(x)
             
         # canvas.draw()
         # canvas.flush_events()
@@ -648,21 +1053,15 @@ def onclick(event):
        # canvas.draw()
         
         
-        if not(x<selection_A):
+        if session.select_right(x):
             ytupel =ax1.get_ylim()
-            width = event.xdata-selection_A
-            ax1.add_patch(Rectangle((selection_A, ytupel[0]), 
+            width = event.xdata-session.selection_A
+            ax1.add_patch(Rectangle((session.selection_A, ytupel[0]), 
                             width, ytupel[1]-ytupel[0], 
                             fc ='cornflowerblue',  
                             ec ='cornflowerblue', 
                             lw = 0, 
                             alpha=0.25) ) 
-            selection_B = x
-            right_select = True
-            # find indies to set the position right
-            idcs = np.where(time_axis<selection_B)
-            ps = idcs[0][-1]
-            sa.audio.setpos(ps)
             # popping the 3rd line
             line = ax1.get_lines()
                         
@@ -674,12 +1073,7 @@ def onclick(event):
             patches = ax1.patches
             
             # also update the text box:
-            for tt in ax2.texts:
-                coor = tt.get_position()
-                if coor[0] <= x:
-                    tt.get_bbox_patch().set_facecolor('green')
-                else:
-                    tt.get_bbox_patch().set_facecolor('red')
+            color_labels(x)
         
            # refresh()
         else:
@@ -692,9 +1086,7 @@ def onclick(event):
             while len(line)>2:
                 line[2].remove()
                 line = ax1.get_lines()
-    canvas.draw()
-    #canvas.flush_events
-    bg = canvas.copy_from_bbox(ax1.bbox)
+    draw_canvas()
 def pause_audio():
     if not constructed:
         return
@@ -715,22 +1107,18 @@ def play_audio():
     if segment_playing:
         pause_audio()
     
-    # Make sure stream is stopped before starting
-    if stream.is_active():
-        stream.stop_stream()
-    
-    # Reset audio position if needed
-    at = sa.audio.tell()
+    # play on to the end of the file
+    session.playhead.seek(session.playhead.tell())
     
     # Draw words without causing errors
     try:
-        if len(sa.aligned_words) > 0:
+        if len(session.aligner.aligned_words) > 0:
             draw_words()
         else:
-            canvas.draw()
+            draw_canvas()
     except Exception as e:
         print(f"Warning: Error in draw_words: {e}")
-        canvas.draw()
+        draw_canvas()
     
     playing = True
     
@@ -738,6 +1126,7 @@ def play_audio():
     my_thread = threading.Thread(target=start_audio_stream)
     my_thread.daemon = True  # Make thread daemon so it exits when main program exits
     my_thread.start()
+    refresh_root()
         
 def play_pause(event = None):
     if not constructed:
@@ -751,34 +1140,37 @@ def play_pause(event = None):
 def play_segment():
     if not constructed:
         return
-    if not right_select: return
+    if not session.right_select: return
     global playing, segment_playing, my_thread
     if playing:
         pause_audio()
-    if not selection_A and selection_B and (selection_B>selection_A):
+    if not session.selection_A and session.selection_B and (session.selection_B>session.selection_A):
         return
     playing = True
     segment_playing = True
-    idcs = np.where(time_axis<selection_A)
-    ps = idcs[0][-1]
-    sa.audio.setpos(ps)
+    # the callback stops on the last frame of the selection
+    start, stop = session.segment_frames()
+    session.playhead.seek(start, stop)
     my_thread = threading.Thread(target=start_audio_stream)
-    my_thread.start() 
+    my_thread.start()
+    refresh_root()
     
    # print('playing audio')     
     
 def refresh():
     #print('refresh')
-    global segment_playing, bg #, words_in_view
+    global segment_playing, bg, cursor_px #, words_in_view
    # global start_time
     
-    canvas.restore_region(bg)
+    at = play_position()
+    x = timebase.to_time(at)
+    # nothing to draw until the cursor reaches the next pixel
+    px = round(ax1.transData.transform((x, 0))[0])
+    if px == cursor_px:
+        return
+    cursor_px = px
     
-    at = sa.audio.tell()
-    if at == len(time_axis):
-        x = time_axis[-1] 
-    else:
-        x = time_axis[at] #time.thread_time()
+    canvas.restore_region(bg)
    
     lim_old = ax1.get_xlim()
     lim_new = lim_old
@@ -795,7 +1187,7 @@ def refresh():
             lin.set_xdata([x])
             lin.set_animated(True)
             ax1.draw_artist(lin)
-        elif x>selection_A:
+        elif x>session.selection_A:
             lin = ax1.axvline(x=x, color = 'royalblue', lw = 0.5)
             lin.set_animated(True)
             ax1.draw_artist(lin)
@@ -814,17 +1206,15 @@ def refresh():
                      
             #ax.set_xlim((lim_[0]+adjust, lim_[1]+adjust))
             lim_new = (x-x_scale/2, x+x_scale/2)
-            if lim_new[0] < time_axis[0]:
-                lim_new = (time_axis[0], x_scale)
-            if lim_new[1] > time_axis[-1]:
-                lim_new = (time_axis[-1]-x_scale,time_axis[-1])
-            ax1.set_xlim(lim_new)
-            ax2.set_xlim(lim_new)
+            if lim_new[0] < 0:
+                lim_new = (0, x_scale)
+            if lim_new[1] > timebase.end:
+                lim_new = (timebase.end-x_scale,timebase.end)
+            set_view(lim_new)
             draw_words()
-            bg = canvas.copy_from_bbox(ax1.bbox)
         # i = 0
         # words_in_view = []
-        # for word in sa.all_aligned_words:
+        # for word in session.words:
         #     if word[2]:                    
         #         if lim_new[0]-1< word[2] and lim_new[1]+1> word[2]:
         #             words_in_view.append(i)
@@ -833,18 +1223,10 @@ def refresh():
      #update text colors    
     for pp in patches:
         ax1.draw_artist(pp)
-    if ax2.texts:
-        for tt in ax2.texts:
-           
-            coor = tt.get_position()
-            #if coor[0] > lim_new[0]-x_scale/2 and coor[1] < lim_new[1]+x_scale/2:
-            bxp = tt.get_bbox_patch()
-            if coor[0] <= x:
-                bxp.set_facecolor('green')
-            else:
-               bxp.set_facecolor('red')
-            ax2.draw_artist(tt)
-            # ax2.draw_artist(tt)
+    # the labels stay drawn in the canvas buffer, only redraw those that changed colour
+    crossed = color_crossed_labels(x)
+    for tt in crossed:
+        ax2.draw_artist(tt)
         # for ii in words_in_view:
            
         #     coor = ax2.texts[ii].get_position()
@@ -863,7 +1245,9 @@ def refresh():
     #canvas.restore_region(bg)
     #canvas.draw()
     
-    canvas.blit()
+    canvas.blit(ax1.bbox)
+    if crossed:
+        canvas.blit(ax2.bbox)
     
     # flush_events kills everything on MAC... wtf?
    # canvas.flush_events()
@@ -873,28 +1257,42 @@ def refresh():
    # print("FPS: ", 1.0 / ((time.time() - start_time)+0.0000001)) # FPS = 1 / time to process loop
   # start_time = time.time()
 #    canvas2.draw()
-    if segment_playing and x >= selection_B:
-        pause_audio()
 
 def refresh_root():
-    #print('refresh_root')
-    if playing:
-        refresh()
-    root.after(17, refresh_root)
+    # wake the playback refresh; it goes back to sleep when playback stops
+    global refresh_job
+    if refresh_job is None:
+        refresh_job = root.after_idle(refresh_tick)
+
+def refresh_tick():
+    global refresh_job, render_time
+    if not playing:
+        refresh_job = None
+        return
+    t0 = time.perf_counter()
+    refresh()
+    render_time = 0.8*render_time + 0.2*(time.perf_counter() - t0)
+    refresh_job = root.after(frame_interval(), refresh_tick)
+
+def frame_interval():
+    # a frame when the cursor has moved a pixel at the current zoom, but not
+    # faster than the display or than refresh() keeps up with under load
+    xl = ax1.get_xlim()
+    seconds_per_pixel = (xl[1]-xl[0])/max(ax1.bbox.width, 1)
+    interval = min(max(seconds_per_pixel, min_interval, 2*render_time), max_interval)
+    return max(int(1000*interval), 1)
 def right_step():
     if not constructed:
         return
     if playing or segment_playing:
         return
-    global  sa #,words_in_view
+    #global words_in_view
     
     xl = ax1.get_xlim()
-    if (xl[1]+step_width)<time_axis[-1]:
-        ax1.set_xlim((xl[0]+step_width, xl[1]+step_width))
-        ax2.set_xlim((xl[0]+step_width, xl[1]+step_width))
+    if (xl[1]+step_width)<timebase.end:
+        set_view((xl[0]+step_width, xl[1]+step_width))
     else:
-        ax1.set_xlim((time_axis[-1]-x_scale), time_axis[-1])
-        ax2.set_xlim((time_axis[-1]-x_scale, time_axis[-1]))
+        set_view((timebase.end-x_scale, timebase.end))
     
     
     
@@ -912,33 +1310,29 @@ def right_step():
     draw_words() # will draw canvas too
     # i = 0
     # words_in_view = []
-    # for word in sa.all_aligned_words:
+    # for word in session.words:
     #     if word[2]:                    
     #         if xl[0]-1< word[2] and xl[1]+1> word[2]:
     #             words_in_view.append(i)
     #         i +=1
     # canvas.draw()
     # canvas2.draw()
-
-    
-    
-    draw_words() # will draw canvas too   
 def start_audio_stream():
+    # a stream that completed on its own still has to be stopped before it restarts
+    if not stream.is_stopped():
+        stream.stop_stream()
     stream.start_stream()
     
     
 def stop_audio():
-    global playing, left_select, right_select, selection_A, selection_B
+    global playing
     if playing:
         my_thread.join()
     
     playing = False
-    right_select = False
-    left_select = False
-    selection_A = 0
-    selection_B = time_axis[-1]
+    session.clear_selection()
     stream.stop_stream()
-    sa.audio.setpos(int(0))
+    session.playhead.seek(0)
     patches = ax1.patches
     if patches:
         patches[0].remove()
@@ -946,14 +1340,87 @@ def stop_audio():
     while len(line)>1:
         line[1].remove()
         line = ax1.get_lines()
-    ax1.set_xlim((0, x_scale))
-    ax2.set_xlim((0, x_scale))
-    canvas.draw()
+    set_view((0, x_scale))
+    draw_words()
     canvas.flush_events()
    # canvas.flush_events()
   #  canvas2.draw()
     
-# note insertions need to be sanity checked for empty characters points etc
+def word_at(index):
+    # position of the word tagged at a text index
+    for tag in txt.tag_names(index):
+        if tag in tag_positions:
+            return tag_positions[tag]
+    return None
+
+def reconcile_text():
+    # re-read the edited region of the transcript, from the last intact word before
+    # the edits to the first intact word after them, into session.words; unchanged
+    # and in-place changed words keep their timings
+    # returns (start, stop) of the replaced words (stop None if later words were
+    # renumbered), or None if nothing was edited
+    global text_dirty, text_tags, tag_positions
+    if not text_dirty:
+        return None
+    text_dirty = False
+    
+    prev = txt.tag_prevrange('word', 'dirty_start')
+    lo = word_at(prev[0]) if prev else None
+    if lo is None:
+        lo, region_start = 0, '1.0'
+    else:
+        region_start = str(txt.tag_ranges(text_tags[lo])[0])
+    nxt = txt.tag_nextrange('word', 'dirty_end')
+    hi = word_at(nxt[0]) if nxt else None
+    if hi is None or hi < lo:
+        hi, region_end = len(text_tags), 'end-1c'
+    else:
+        region_end = str(txt.tag_ranges(text_tags[hi])[-1])
+        hi += 1
+    
+    region = txt.get(region_start, region_end)
+    tokens = list(re.finditer(r'\S+', region))
+    old_words = session.words[lo:hi]
+    matcher = difflib.SequenceMatcher(None, [ww[1] for ww in old_words],
+                                      [match.group() for match in tokens], autojunk=False)
+    # (word, start, end, token) for every word of the region
+    new_words = []
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op == 'equal':
+            new_words += [old_words[ii][1:] + (tokens[jj],)
+                          for ii, jj in zip(range(i1, i2), range(j1, j2))]
+            continue
+        n_changed = min(i2 - i1, j2 - j1) if op == 'replace' else 0
+        for ii, jj in zip(range(i1, i1 + n_changed), range(j1, j1 + n_changed)):
+            # changed in place: keep the timing
+            new_words.append((tokens[jj].group(),) + old_words[ii][2:] + (tokens[jj],))
+        for jj in range(j1 + n_changed, j2):
+            ww = tokens[jj].group().translate(str.maketrans('', '', string.punctuation))
+            if ww:
+                new_words.append((ww, None, None, tokens[jj]))
+    
+    # re-tag the region
+    if hi > lo:
+        txt.tag_delete(*text_tags[lo:hi])
+    txt.tag_remove('word', region_start, region_end)
+    new_tags = [new_tag() for ww in new_words]
+    word_ranges = []
+    for ww, tag in zip(new_words, new_tags):
+        first = region_start + '+' + str(ww[3].start()) + 'c'
+        last = region_start + '+' + str(ww[3].end()) + 'c'
+        txt.tag_add(tag, first, last)
+        word_ranges += [first, last]
+    if word_ranges:
+        txt.tag_add('word', *word_ranges)
+    text_tags[lo:hi] = new_tags
+    tag_positions = {tag: ii for ii, tag in enumerate(text_tags)}
+    
+    session.words[lo:hi] = [("w" + str(lo + ii),) + ww[:3] for ii, ww in enumerate(new_words)]
+    if len(new_words) == hi - lo:
+        return lo, hi
+    session.words.renumber()
+    return lo, None
+
 def txt_update():
     global listbox, last_list_sel
     tmp = listbox.curselection()
@@ -961,114 +1428,98 @@ def txt_update():
         last_list_sel = tmp
     if not constructed:
         return
-    new_words = []
-    ix2 = '99.99'
-    for word in sa.all_aligned_words:
-        try:
-            ix1 = txt.index(word[0] + '.first')
-        except:
-            print("deletion detected")
-            continue
-                  
-        segs1 = ix1.split('.')    
-        segs2 = ix2.split('.')   
-        if (int(segs1[0])-int(segs2[0]) > 0) or (
-                int(segs1[1])-int(segs2[1]) > 1) or (
-                    ix2 == '99.99' and not(ix1 == '1.0')): 
-                        
-            print('insertion detected')
-            
-            if ix2 == '99.99': ix2 = '1.0'
-            
-            inserted_text = txt.get(ix2,ix1)
-            inserted_words = inserted_text.split()
-            for ww in inserted_words:
-                ww = ww.translate(str.maketrans('', '',string.punctuation))
-                new_words.append((None, ww, None, None))
-        
-        ix2 = txt.index(word[0] + '.last')
-        
-        wrd = txt.get(ix1,ix2)
-        if not(wrd == word[1]):
-            print('change detected')
-            new_words.append((word[0], wrd, word[2], word[3]))
-        else:
-            new_words.append(word)
-    remainder = txt.get(ix2,'end')
-    if remainder.split():
-        print('additional words detected')
-        
-        inserted_words = remainder.split()
-        for ww in inserted_words:
-            ww = ww.translate(str.maketrans('', '',string.punctuation))
-            new_words.append((None, ww, None, None))
-    sa.all_aligned_words = []
-    
-    tmpid = 0
-    for ww in new_words:
-            idstring = "w" + str(tmpid)
-            sa.all_aligned_words.append((idstring, ww[1], ww[2], ww[3]))
-            tmpid +=1
-    fill_listbox()
-    add_text()
-    draw_words()
+    changed = reconcile_text()
+    if changed:
+        fill_listbox(*changed)
+        draw_words()
+    highlight_done()
        
 
 
-leftphoto = tk.PhotoImage(file = 'semi_files//img//left.png')
-#labelphoto.pack()
-leftbutton = tk.Button(root,image = leftphoto, command = left_step)
-leftbutton.place(x = 0, y = 0, width=30, height=30)
+def build_toolbar():
+    # the images have to stay referenced, or tk drops them
+    global leftphoto, playphoto, pausephoto, stopphoto, rigthphoto, segphoto, doublerigthphoto
+    leftphoto = tk.PhotoImage(file = 'semi_files//img//left.png')
+    #labelphoto.pack()
+    leftbutton = tk.Button(root,image = leftphoto, command = left_step)
+    leftbutton.place(x = 0, y = 0, width=30, height=30)
 
-playphoto = tk.PhotoImage(file = 'semi_files//img//play.png')
-#labelphoto.pack()
-playbutton = tk.Button(root,image = playphoto, command = play_audio)
-playbutton.place(x = 30, y = 0, width=30, height=30)
+    playphoto = tk.PhotoImage(file = 'semi_files//img//play.png')
+    #labelphoto.pack()
+    playbutton = tk.Button(root,image = playphoto, command = play_audio)
+    playbutton.place(x = 30, y = 0, width=30, height=30)
 
-pausephoto = tk.PhotoImage(file = 'semi_files//img//pause.png')
-#labelphoto.pack()
-pausebutton = tk.Button(root,image = pausephoto, command = pause_audio)
-pausebutton.place(x = 60, y = 0, width=30, height=30)
+    pausephoto = tk.PhotoImage(file = 'semi_files//img//pause.png')
+    #labelphoto.pack()
+    pausebutton = tk.Button(root,image = pausephoto, command = pause_audio)
+    pausebutton.place(x = 60, y = 0, width=30, height=30)
 
-stopphoto = tk.PhotoImage(file = 'semi_files//img//stop.png')
-#labelphoto.pack()
-stopbutton = tk.Button(root,image = stopphoto, command = stop_audio)
-stopbutton.place(x = 90, y = 0, width=30, height=30)
+    stopphoto = tk.PhotoImage(file = 'semi_files//img//stop.png')
+    #labelphoto.pack()
+    stopbutton = tk.Button(root,image = stopphoto, command = stop_audio)
+    stopbutton.place(x = 90, y = 0, width=30, height=30)
 
 
-rigthphoto = tk.PhotoImage(file = 'semi_files//img//right.png')
-#labelphoto.pack()
-rightbutton = tk.Button(root,image = rigthphoto, command = right_step)
-rightbutton.place(x = 120, y = 0, width=30, height=30)
+    rigthphoto = tk.PhotoImage(file = 'semi_files//img//right.png')
+    #labelphoto.pack()
+    rightbutton = tk.Button(root,image = rigthphoto, command = right_step)
+    rightbutton.place(x = 120, y = 0, width=30, height=30)
 
 
 
-segphoto = tk.PhotoImage(file = 'semi_files//img//play2.png')
-#labelphoto.pack()
-segbutton = tk.Button(root,image = segphoto, command = play_segment)
-segbutton.place(x = 150, y = 0, width=30, height=30)
+    segphoto = tk.PhotoImage(file = 'semi_files//img//play2.png')
+    #labelphoto.pack()
+    segbutton = tk.Button(root,image = segphoto, command = play_segment)
+    segbutton.place(x = 150, y = 0, width=30, height=30)
 
 
-doublerigthphoto = tk.PhotoImage(file = 'semi_files//img//doubleright.png')
-#labelphoto.pack()
-doublerightbutton = tk.Button(root,image = doublerigthphoto, command = doubleright_step)
-doublerightbutton.place(x = 180, y = 0, width=30, height=30)
+    doublerigthphoto = tk.PhotoImage(file = 'semi_files//img//doubleright.png')
+    #labelphoto.pack()
+    doublerightbutton = tk.Button(root,image = doublerigthphoto, command = doubleright_step)
+    doublerightbutton.place(x = 180, y = 0, width=30, height=30)
 
 
 
-# add the function for the space bar
-root.bind("<Return>", play_pause)
-
-# audioname = 'semi_files//data//grav1.wav'
-# textname = 'semi_files//data//grav1.txt'
-# add_elements()
-# refresh_root()
-
+def main():
+    global root, audioname, textname
+    logging.basicConfig(level=logging.INFO)
+    # the window comes up right away, the rest loads while the user picks the files
+    start_preload()
+    
+    root = tk.Tk()
+    root.geometry('1000x550+50+50')
+    root.title("SeMi-automatic aligner")
+    
+    # #Icons made by <a href="https://www.flaticon.com/authors/skyclick" title="Skyclick">Skyclick</a> from <a href="https://www.flaticon.com/" title="Flaticon"> www.flaticon.com</a>
+    
+    #root.iconbitmap('semi_files//img//brain.ico')
+    
+    root.tk.call('wm', 'iconphoto', root._w, tk.PhotoImage(file= 'semi_files//img//brain.png'))
+    
+    root.configure(background= 'white')
+    
+    build_menu()
+    build_toolbar()
+    
+    # add the function for the space bar
+    root.bind("<Return>", play_pause)
+    root.bind("<<PlaybackDone>>", on_playback_done)
+    root.after_idle(report_startup)
+    
+    # audioname = 'semi_files//data//grav1.wav'
+    # textname = 'semi_files//data//grav1.txt'
+    # add_elements()
+    # refresh_root()
+    
+    
+    if open_with_files:
+        audioname = 'semi_files//data//grav1.wav'
+        textname = 'semi_files//data//grav1.txt'
+        add_elements()
+        refresh_root()
+    
+    root.mainloop()
 
-if open_with_files:
-    audioname = 'semi_files//data//grav1.wav'
-    textname = 'semi_files//data//grav1.txt'
-    add_elements()
-    refresh_root()
 
-root.mainloop()
+if __name__ == '__main__':
+    main()
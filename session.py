@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Session - The state of an alignment session, independent of any GUI
+"""
+import logging
+import queue
+import threading
+
+from audio_source import Playhead
+from mfa_aligner import SegmentAligner, read_words_csv, write_words_csv
+
+logger = logging.getLogger(__name__)
+
+
+class AlignmentSession:
+    """A recording, its transcript and their alignment
+
+    Owns the word table, the audio source, the playback position, the
+    selected segment and the aligner. semi_align.py is a view over a session;
+    scripts, worker processes and benchmarks use the same object without a
+    display. Importing this module has no side effects.
+    """
+
+    def __init__(self, audiofile, textfile, temp_path, **aligner_options):
+        """Open a recording and its transcript
+
+        Args:
+            audiofile: Path to the .wav file
+            textfile: Path to the .txt transcript
+            temp_path: Directory for temporary alignment files
+            **aligner_options: Further arguments for SegmentAligner (models,
+                use_worker, cache_dir, ...)
+        """
+        self.aligner = SegmentAligner(audiofile, textfile, temp_path, **aligner_options)
+        self.source = self.aligner.source
+        self.timebase = self.source.timebase
+        # Playback position, separate from the reads for plotting and alignment
+        self.playhead = Playhead(self.source)
+        self.clear_selection()
+
+        # Background alignments run one after another in a worker thread
+        self._jobs = queue.Queue()
+        self._thread = None
+
+    @property
+    def words(self):
+        """WordTable of the transcript"""
+        return self.aligner.all_aligned_words
+
+    @words.setter
+    def words(self, table):
+        self.aligner.all_aligned_words = table
+
+    # -- selection
+
+    @property
+    def selection(self):
+        """Selected segment as (start, end) in seconds"""
+        return (self.selection_A, self.selection_B)
+
+    def clear_selection(self):
+        """Select the whole recording"""
+        self.selection_A = 0
+        self.selection_B = self.timebase.end
+        self.left_select = False
+        self.right_select = False
+
+    def select_left(self, t):
+        """Start the selection at t seconds; it runs to the end until select_right"""
+        self.selection_A = t
+        self.selection_B = self.timebase.end
+        self.left_select = True
+        self.right_select = False
+        self.playhead.seek(self.timebase.to_frame(t))
+
+    def select_right(self, t):
+        """End the selection at t seconds
+
+        Returns:
+            False (and leaves the selection unchanged) if t is before its start
+        """
+        if t < self.selection_A:
+            return False
+        self.selection_B = t
+        self.right_select = True
+        self.playhead.seek(self.timebase.to_frame(t))
+        return True
+
+    def segment_frames(self):
+        """Selected segment as (start, stop) frame indices"""
+        return self.timebase.to_frame_range(self.selection_A, self.selection_B)
+
+    # -- alignment
+
+    def align(self, word_sel, audio_sel=None, progress_callback=None):
+        """Align words and store their timings
+
+        Args:
+            word_sel: (start, stop) indices of the words to align
+            audio_sel: (start, end) of the audio in seconds (default: the selection)
+            progress_callback: Function(fraction, message) for progress updates (optional)
+
+        Returns:
+            The aligned (id_string, word, start, end) tuples
+
+        Raises:
+            RuntimeError: If the alignment fails
+        """
+        words = self.words[word_sel[0]:word_sel[1]]
+        words_id = self.aligner.align_words(audio_sel or self.selection, words, progress_callback)
+        self.merge_alignment(word_sel, words, words_id)
+        return words_id
+
+    @property
+    def jobs_pending(self):
+        """Number of background alignments queued or running"""
+        return self._jobs.unfinished_tasks
+
+    def submit_alignment(self, word_sel, on_done, audio_sel=None, progress_callback=None):
+        """Queue an alignment to run in the background
+
+        The words are not stored by the session: on_done receives them from
+        the worker thread and passes them to merge_alignment (a GUI does so
+        on its own thread).
+
+        Args:
+            word_sel: (start, stop) indices of the words to align
+            on_done: Function(word_sel, words, words_id, error) called when the
+                job finished; words are the words as submitted, error is None
+                or the error message
+            audio_sel: (start, end) of the audio in seconds (default: the selection)
+            progress_callback: Function(fraction, message) for progress updates (optional)
+        """
+        # Keep a copy of the words so merging can check they are unchanged
+        words = self.words[word_sel[0]:word_sel[1]]
+        self._jobs.put((audio_sel or self.selection, word_sel, words, on_done, progress_callback))
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._alignment_worker, daemon=True)
+            self._thread.start()
+
+    def _alignment_worker(self):
+        while True:
+            audio_sel, word_sel, words, on_done, progress_callback = self._jobs.get()
+            try:
+                words_id = self.aligner.align_words(audio_sel, words, progress_callback)
+                error = None
+            except Exception as e:
+                logger.error(f"Background alignment failed: {e}")
+                words_id, error = None, str(e)
+            self._jobs.task_done()
+            on_done(word_sel, words, words_id, error)
+
+    def merge_alignment(self, word_sel, words, words_id):
+        """Store aligned words, unless the transcript changed since they were submitted
+
+        Args:
+            word_sel: (start, stop) indices of the aligned words
+            words: The words as they were submitted
+            words_id: The aligned words
+
+        Returns:
+            True if the timings were stored
+        """
+        current = self.words[word_sel[0]:word_sel[1]]
+        if [ww[:2] for ww in current] != [ww[:2] for ww in words]:
+            return False
+        self.words[word_sel[0]:word_sel[1]] = words_id
+        return True
+
+    # -- saving and loading
+
+    def save_csv(self, file_path):
+        """Write the words and their timings to a .csv file"""
+        write_words_csv(file_path, self.words)
+
+    def load_csv(self, file_path):
+        """Take over the timings from a .csv file saved earlier
+
+        Raises:
+            ValueError: If its words do not match the transcript
+        """
+        self.merge_words(read_words_csv(file_path))
+
+    def merge_words(self, words_read, strict=True):
+        """Take over the timings of words read from a .csv file
+
+        Args:
+            words_read: List of (id_string, word, start, end) tuples
+            strict: Raise if a word does not match the transcript instead of
+                skipping it
+
+        Raises:
+            ValueError: If strict and a word does not match (nothing is changed then)
+        """
+        matches = [ii < len(self.words) and tuple(self.words[ii][:2]) == tuple(ww[:2])
+                   for ii, ww in enumerate(words_read)]
+        if strict and not all(matches):
+            raise ValueError("there is a mismatch between the words")
+        # One assignment, so the onset index is updated once
+        n = min(len(words_read), len(self.words))
+        rows = self.words[0:n]
+        for ii in range(n):
+            if matches[ii]:
+                rows[ii] = words_read[ii]
+        self.words[0:n] = rows
+
+    def close(self):
+        """Stop the alignment worker process, release the workspace and the recording"""
+        self.aligner.mfa.close()
+        self.source.close()
@@ -0,0 +1,32 @@
+"""
+Shared fixtures of the tests
+"""
+import sys
+import wave
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# The modules live at the top of the repository, not in a package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def write_wav(path, samples, sr=16000):
+    """Write int16 samples (1-D for mono, one column per channel) to a WAV file"""
+    samples = np.asarray(samples, dtype='<i2')
+    if samples.ndim == 1:
+        samples = samples[:, None]
+    with wave.open(str(path), mode='wb') as wav:
+        wav.setnchannels(samples.shape[1])
+        wav.setsampwidth(2)
+        wav.setframerate(sr)
+        wav.writeframes(samples.tobytes())
+    return path
+
+
+@pytest.fixture
+def wav_file(tmp_path):
+    """Four seconds of a quiet 16 kHz mono tone"""
+    t = np.arange(4 * 16000) / 16000
+    return write_wav(tmp_path / "audio.wav", 1000 * np.sin(2 * np.pi * 220 * t))
@@ -0,0 +1,64 @@
+"""
+Tests of the alignment result cache
+"""
+import json
+import os
+
+from alignment_cache import AlignmentCache
+
+RESULT = {"words": [{"word": "hello", "start": 0.1, "end": 0.4}], "duration": 0.5}
+ENTRY_BYTES = len(json.dumps(RESULT).encode('utf-8'))
+
+
+def _age(cache, key, seconds_ago):
+    """Make an entry look last used seconds_ago"""
+    path = cache._path(key)
+    mtime = path.stat().st_mtime - seconds_ago
+    os.utime(path, (mtime, mtime))
+
+
+def test_put_and_get(tmp_path):
+    cache = AlignmentCache(tmp_path)
+    key = AlignmentCache.make_key("digest", ["hello"], "models")
+
+    assert cache.get(key) is None
+    cache.put(key, RESULT)
+    assert cache.get(key) == RESULT
+    assert (cache.hits, cache.misses) == (1, 1)
+    # Entries persist across instances
+    assert AlignmentCache(tmp_path).get(key) == RESULT
+
+
+def test_key_depends_on_audio_words_and_models():
+    key = AlignmentCache.make_key("digest", ["a", "b"], "models")
+
+    assert key == AlignmentCache.make_key("digest", ["a", "b"], "models")
+    assert key != AlignmentCache.make_key("other", ["a", "b"], "models")
+    assert key != AlignmentCache.make_key("digest", ["a", "c"], "models")
+    assert key != AlignmentCache.make_key("digest", ["a", "b"], "other")
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = AlignmentCache(tmp_path, max_bytes=3 * ENTRY_BYTES)
+    keys = [AlignmentCache.make_key(f"digest{i}", ["hello"], "models") for i in range(4)]
+    for age, key in zip((300, 200, 100), keys):
+        cache.put(key, RESULT)
+        _age(cache, key, age)
+
+    # Using the oldest entry makes the second one the least recently used
+    assert cache.get(keys[0]) == RESULT
+    cache.put(keys[3], RESULT)
+
+    assert cache.stats()["bytes"] <= 3 * ENTRY_BYTES
+    assert [cache.get(key) is not None for key in keys] == [True, False, True, True]
+
+
+def test_clear_removes_all_entries(tmp_path):
+    cache = AlignmentCache(tmp_path)
+    key = AlignmentCache.make_key("digest", ["hello"], "models")
+    cache.put(key, RESULT)
+
+    cache.clear()
+
+    assert cache.get(key) is None
+    assert cache.stats()["bytes"] == 0
@@ -0,0 +1,88 @@
+"""
+Tests of the time base and the memory-mapped WAV source
+"""
+import struct
+
+import numpy as np
+import pytest
+
+from audio_source import TimeBase, WavSource
+from conftest import write_wav
+
+
+def test_timebase_converts_and_clamps():
+    tb = TimeBase(sr=100, n_frames=1000)
+
+    assert tb.end == pytest.approx(9.99)
+    assert tb.to_time(250) == pytest.approx(2.5)
+    assert tb.to_time(-5) == 0.0
+    assert tb.to_time(5000) == pytest.approx(9.99)
+    # The last frame before t
+    assert tb.to_frame(2.5) == 249
+    assert tb.to_frame(2.505) == 250
+    assert tb.to_frame(-1.0) == 0
+    assert tb.to_frame(100.0) == 999
+
+
+def test_timebase_frame_range_covers_interval():
+    tb = TimeBase(sr=100, n_frames=1000)
+
+    assert tb.to_frame_range(1.0, 2.0) == (100, 200)
+    assert tb.to_frame_range(1.005, 1.995) == (100, 200)
+    assert tb.to_frame_range(-1.0, 20.0) == (0, 1000)
+    assert tb.to_frame_range(5.0, 4.0) == (500, 500)
+
+
+def test_timebase_of_empty_recording():
+    tb = TimeBase(sr=16000, n_frames=0)
+
+    assert tb.end == 0.0
+    assert tb.to_frame(1.0) == 0
+    assert tb.to_frame_range(0.0, 1.0) == (0, 0)
+
+
+def test_wav_source_maps_pcm16(tmp_path):
+    samples = np.arange(-500, 500, dtype=np.int16).reshape(-1, 2)
+    source = WavSource(write_wav(tmp_path / "stereo.wav", samples, sr=8000))
+
+    assert (source.n_channels, source.sr, source.n_frames) == (2, 8000, 500)
+    assert not source.is_float
+    assert np.array_equal(source.channel(1), samples[:, 1])
+    assert source.read_frames(10, 2) == samples[10:12].tobytes()
+    assert source.read_frames(499, 10) == samples[499:].tobytes()
+
+
+def _write_raw_wav(path, audio_format, n_channels, sr, bits, data):
+    block_align = n_channels * bits // 8
+    fmt = struct.pack('<HHIIHH', audio_format, n_channels, sr, sr * block_align, block_align, bits)
+    with open(path, 'wb') as f:
+        f.write(b'RIFF' + struct.pack('<I', 36 + len(data)) + b'WAVE')
+        f.write(b'fmt ' + struct.pack('<I', len(fmt)) + fmt)
+        f.write(b'data' + struct.pack('<I', len(data)) + data)
+    return path
+
+
+def test_wav_source_decodes_pcm24(tmp_path):
+    values = np.array([[0, -1], [8388607, -8388608], [1234567, -7654321]], dtype=np.int32)
+    data = b''.join(int(v).to_bytes(3, 'little', signed=True) for v in values.ravel())
+    source = WavSource(_write_raw_wav(tmp_path / "pcm24.wav", 1, 2, 16000, 24, data))
+
+    assert source.n_frames == 3
+    assert np.array_equal(source.channel(0, chunk=2), values[:, 0])
+    assert np.array_equal(source.channel(1, chunk=2), values[:, 1])
+    assert source.read_frames(1, 1) == data[6:12]
+
+
+def test_wav_source_flags_float(tmp_path):
+    samples = np.array([0.0, 0.5, -0.25], dtype='<f4')
+    source = WavSource(_write_raw_wav(tmp_path / "float.wav", 3, 1, 16000, 32, samples.tobytes()))
+
+    assert source.is_float
+    assert np.array_equal(source.channel(0), samples)
+
+
+def test_wav_source_rejects_other_files(tmp_path):
+    path = tmp_path / "not.wav"
+    path.write_bytes(b'RIFF\0\0\0\0AVI LIST')
+    with pytest.raises(ValueError):
+        WavSource(path)
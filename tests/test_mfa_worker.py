@@ -0,0 +1,93 @@
+"""
+Tests of the persistent alignment worker (stub backend) and MFAWrapper's use of it
+"""
+import pytest
+
+from mfa_aligner import MFAWrapper
+from mfa_worker import AlignmentWorker
+
+
+@pytest.fixture
+def stub_worker():
+    worker = AlignmentWorker("unused.dict", "unused", backend="stub")
+    worker.start()
+    yield worker
+    worker.close()
+
+
+def test_stub_worker_aligns_file_job(stub_worker, wav_file, tmp_path):
+    text_path = tmp_path / "audio.txt"
+    text_path.write_text("hello\nbrave new world\n")
+
+    result = stub_worker.align(wav_file, text_path)
+
+    assert [w["word"] for w in result["words"]] == ["hello", "brave", "new", "world"]
+    assert result["duration"] == pytest.approx(4.0)
+    assert result["words"][0]["start"] == 0.0
+    assert result["words"][-1]["end"] == pytest.approx(4.0)
+
+
+def test_stub_worker_aligns_region_in_place(stub_worker, wav_file):
+    result = stub_worker.align(wav_file, begin=1.0, end=2.0, transcript="one two")
+
+    assert result["duration"] == pytest.approx(1.0)
+    # Times are relative to begin, not to the start of the file
+    assert [(w["start"], w["end"]) for w in result["words"]] == [
+        pytest.approx((0.0, 0.5)), pytest.approx((0.5, 1.0))]
+
+
+def test_stub_worker_reports_failed_jobs(stub_worker, tmp_path):
+    with pytest.raises(RuntimeError):
+        stub_worker.align(tmp_path / "missing.wav", transcript="word")
+    # The worker keeps serving after a failed job
+    assert stub_worker.is_alive()
+
+
+@pytest.fixture
+def wrapper(tmp_path):
+    """MFAWrapper with local model files and a registry of its own"""
+    dictionary = tmp_path / "models" / "test.dict"
+    dictionary.parent.mkdir()
+    dictionary.write_text("hello HH AH0 L OW1\n")
+    acoustic_model = tmp_path / "models" / "test.zip"
+    acoustic_model.write_bytes(b"")
+    mfa = MFAWrapper(temp_path=tmp_path / "temp", cache_dir=tmp_path / "cache",
+                     dictionary_path=str(dictionary), acoustic_model_path=str(acoustic_model),
+                     use_pretrained_acoustic=False)
+    yield mfa
+    mfa.close()
+
+
+def test_align_region_uses_stub_worker(wrapper, wav_file):
+    wrapper.start_worker("stub")
+
+    result = wrapper.align_region(wav_file, 2.0, 4.0, "a b c d")
+
+    assert [w["start"] for w in result["words"]] == pytest.approx([0.0, 0.5, 1.0, 1.5])
+
+
+def test_unready_worker_falls_back_to_mfa_align(wrapper, wav_file, tmp_path, monkeypatch):
+    # The mfa backend cannot load these (empty) models, so the worker reports ready: false
+    wrapper.start_worker("mfa")
+
+    assert wrapper.align_region(wav_file, 0.0, 1.0, "hello") is None
+    assert wrapper._worker is None
+
+    # align() skips the missing worker and runs the one-shot `mfa align`
+    wrapper.start_worker("mfa")
+    runs = []
+
+    def fake_run(corpus_dir, output_dir, timeout, num_jobs=None):
+        runs.append(sorted(p.name for p in corpus_dir.iterdir()))
+        (output_dir / "tmp.TextGrid").write_text("")
+
+    monkeypatch.setattr(wrapper, "_run_mfa_align", fake_run)
+    monkeypatch.setattr(wrapper, "_parse_textgrid", lambda path: {"words": [], "source": path.name})
+    text_path = tmp_path / "audio.txt"
+    text_path.write_text("hello")
+
+    result = wrapper.align(wav_file, text_path)
+
+    assert runs == [["tmp.txt", "tmp.wav"]]
+    assert result == {"words": [], "source": "tmp.TextGrid"}
+    assert wrapper._worker is None
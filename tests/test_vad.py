@@ -0,0 +1,60 @@
+"""
+Tests of the voice activity detection
+"""
+import numpy as np
+import pytest
+
+from vad import _runs, detect_speech, frame_features
+
+SR = 16000
+
+
+def _recording(bursts, duration=6.0, seed=0):
+    """Low noise with loud tone bursts at the given (start, end) seconds"""
+    rng = np.random.default_rng(seed)
+    data = rng.normal(0, 30, int(duration * SR))
+    t = np.arange(len(data)) / SR
+    for start, end in bursts:
+        burst = (t >= start) & (t < end)
+        data[burst] += 8000 * np.sin(2 * np.pi * 200 * t[burst])
+    return data.astype(np.int16)
+
+
+def test_runs():
+    mask = np.array([0, 1, 1, 0, 0, 1, 0, 1], dtype=bool)
+
+    assert _runs(mask).tolist() == [[1, 3], [5, 6], [7, 8]]
+    assert _runs(np.zeros(3, dtype=bool)).shape == (0, 2)
+
+
+def test_frame_features_do_not_depend_on_chunk_size():
+    data = _recording([(1.0, 2.0)])
+
+    whole = frame_features(data, 320, chunk=len(data))
+    chunked = frame_features(data, 320, chunk=1000)
+
+    assert len(whole[0]) == len(data) // 320
+    assert np.allclose(whole[0], chunked[0])
+    assert np.allclose(whole[1], chunked[1])
+
+
+def test_detects_speech_bursts():
+    regions = detect_speech(_recording([(1.0, 2.0), (3.5, 4.5)]), SR, pad=0.0)
+
+    assert regions.shape == (2, 2)
+    assert regions[:, 0] == pytest.approx([1.0, 3.5], abs=0.03)
+    assert regions[:, 1] == pytest.approx([2.0, 4.5], abs=0.03)
+
+
+def test_merges_short_pauses_and_drops_short_bursts():
+    data = _recording([(1.0, 1.5), (1.6, 2.0), (4.0, 4.1)])
+
+    regions = detect_speech(data, SR, pad=0.1, min_gap=0.3, min_speech=0.25)
+
+    assert regions.shape == (1, 2)
+    assert regions[0] == pytest.approx([0.9, 2.1], abs=0.03)
+
+
+def test_silence_and_empty_input_give_no_regions():
+    assert detect_speech(_recording([]), SR).shape == (0, 2)
+    assert detect_speech(np.zeros(0, dtype=np.int16), SR).shape == (0, 2)
@@ -0,0 +1,71 @@
+"""
+Tests of the columnar word store and its onset index
+"""
+import numpy as np
+
+from word_table import OnsetIndex, WordTable
+
+ROWS = [("w0", "the", 0.5, 0.7), ("w1", "quick", None, None),
+        ("w2", "brown", 1.2, 1.6), ("w3", "fox", 0.9, 1.1)]
+
+
+def test_rows_round_trip():
+    table = WordTable.from_words(ROWS)
+
+    assert len(table) == 4
+    assert table.to_list() == ROWS
+    assert table[-1] == ROWS[-1]
+    assert table[1:3] == ROWS[1:3]
+    assert np.array_equal(table.aligned, [True, False, True, True])
+    assert np.array_equal(table.unaligned(), [1])
+
+
+def test_from_text_is_unaligned():
+    table = WordTable.from_text(["a", "b", "a"])
+
+    assert table.to_list() == [("w0", "a", None, None), ("w1", "b", None, None),
+                               ("w2", "a", None, None)]
+    # Repeated words share a code in the string pool
+    assert table.word_codes[0] == table.word_codes[2]
+
+
+def test_slice_assignment_replaces_and_resizes():
+    table = WordTable.from_words(ROWS)
+
+    table[1:2] = [("w1", "quick", 0.7, 0.9)]
+    assert table[1] == ("w1", "quick", 0.7, 0.9)
+
+    table[1:3] = [("w9", "slow", None, None)]
+    table.renumber()
+    assert [row[:2] for row in table] == [("w0", "the"), ("w1", "slow"), ("w2", "fox")]
+
+
+def test_window_query_is_ordered_by_onset():
+    table = WordTable.from_words(ROWS)
+
+    assert list(table.in_window(0.0, 2.0)) == [0, 3, 2]
+    assert list(table.in_window(0.5, 1.2)) == [3]
+    assert list(table.in_window(2.0, 3.0)) == []
+
+
+def test_index_follows_changes():
+    table = WordTable.from_words(ROWS)
+    assert list(table.in_window(0.0, 2.0)) == [0, 3, 2]
+
+    # In-place updates keep the index, resizing rebuilds it
+    table[1] = ("w1", "quick", 0.8, 0.85)
+    assert list(table.in_window(0.0, 2.0)) == [0, 1, 3, 2]
+    table.shift(1.0, 2)
+    assert list(table.in_window(0.0, 2.0)) == [0, 1, 3]
+    table[0:1] = []
+    assert list(table.in_window(0.0, 3.0)) == [0, 2, 1]
+
+
+def test_index_of_table_matches_index_of_rows():
+    rows = [(f"w{i}", "x", None if i % 3 == 0 else 0.1 * (i % 17), None) for i in range(200)]
+    from_rows = OnsetIndex(rows)
+    from_table = OnsetIndex(WordTable.from_words(rows))
+
+    assert np.array_equal(from_rows.onsets, from_table.onsets)
+    assert np.array_equal(from_rows.positions, from_table.positions)
+    assert len(from_table) == sum(1 for row in rows if row[2] is not None)
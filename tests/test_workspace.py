@@ -0,0 +1,83 @@
+"""
+Tests of the pooled alignment workspaces
+"""
+import os
+
+import pytest
+
+import workspace
+from workspace import WorkspacePool, get_pool
+
+
+def test_concurrent_workspaces_are_isolated(tmp_path):
+    pool = WorkspacePool(tmp_path)
+    a, b = pool.acquire(), pool.acquire()
+
+    assert a.path != b.path
+    (a.corpus_dir / "tmp.wav").write_bytes(b"a")
+    b.subdir("mfa_tmp", clear=True)
+    assert (a.corpus_dir / "tmp.wav").read_bytes() == b"a"
+
+
+def test_released_workspace_is_reused(tmp_path):
+    pool = WorkspacePool(tmp_path)
+    with pool.acquire() as first:
+        path = first.path
+        (first.corpus_dir / "tmp.txt").write_text("kept")
+
+    second = pool.acquire()
+    assert second.path == path
+    assert second.subdir("mfa_tmp", clear=True) == second.corpus_dir
+    assert list(second.corpus_dir.iterdir()) == []
+
+
+def test_idle_workspaces_beyond_max_idle_are_evicted(tmp_path):
+    pool = WorkspacePool(tmp_path, max_idle=2)
+    workspaces = [pool.acquire() for _ in range(4)]
+    for ws in workspaces:
+        ws.release()
+
+    # The two released first are removed
+    assert [ws.path.exists() for ws in workspaces] == [False, False, True, True]
+    # Releasing twice has no effect
+    workspaces[0].release()
+    assert len(pool._idle) == 2
+
+
+def test_close_removes_everything_of_an_owned_root():
+    pool = WorkspacePool()
+    ws = pool.acquire()
+
+    pool.close()
+
+    assert not ws.path.exists()
+    assert not pool.root.exists()
+
+
+def test_close_keeps_a_given_root(tmp_path):
+    pool = WorkspacePool(tmp_path / "root")
+    ws = pool.acquire()
+
+    pool.close()
+
+    assert not ws.path.exists()
+    assert pool.root.exists()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_pools_are_shared_per_process_and_root(tmp_path):
+    try:
+        assert get_pool(tmp_path) is get_pool(tmp_path / ".")
+        assert get_pool(tmp_path) is not get_pool(tmp_path / "other")
+        ws = get_pool(tmp_path).acquire()
+
+        # A forked child inherits the pools but must not remove the parent's
+        pid = os.fork()
+        if pid == 0:
+            workspace.close_pools()
+            os._exit(0)
+        os.waitpid(pid, 0)
+        assert ws.path.exists()
+    finally:
+        workspace.close_pools()
+    assert not ws.path.exists()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+VAD - Energy and zero-crossing based voice activity detection, to propose segments for alignment
+"""
+import numpy as np
+
+
+def frame_features(data, frame_len, chunk=1 << 22):
+    """Return the energy (dB) and zero-crossing rate of every frame of a signal
+
+    Frames do not overlap; a last partial frame is dropped. The signal is
+    processed chunk by chunk, so a memory map is read sequentially and only
+    one chunk is held in memory as floats.
+
+    Args:
+        data: 1-D array of samples (may be a memory map)
+        frame_len: Samples per frame
+        chunk: Samples processed at a time (rounded down to whole frames)
+
+    Returns:
+        Tuple of (energy_db, zcr) arrays with one value per frame
+    """
+    chunk = max(chunk - chunk % frame_len, frame_len)
+    n_frames = len(data) // frame_len
+    energy_db = np.empty(n_frames, dtype=np.float32)
+    zcr = np.empty(n_frames, dtype=np.float32)
+    # 8 bit WAV samples are unsigned around 128
+    offset = 128 if data.dtype == np.uint8 else 0
+    for start in range(0, n_frames*frame_len, chunk):
+        frames = np.asarray(data[start:min(start + chunk, n_frames*frame_len)],
+                            dtype=np.float32).reshape(-1, frame_len)
+        if offset:
+            frames -= offset
+        i = start // frame_len
+        power = np.einsum('ij,ij->i', frames, frames) / frame_len
+        energy_db[i:i + len(frames)] = 10*np.log10(power + 1e-10)
+        negative = frames < 0
+        zcr[i:i + len(frames)] = np.count_nonzero(negative[:, 1:] != negative[:, :-1], axis=1) / frame_len
+    return energy_db, zcr
+
+
+def _runs(mask):
+    """Return the (start, stop) indices of the runs of True in a boolean array"""
+    edges = np.flatnonzero(np.diff(np.concatenate(([False], mask, [False])).astype(np.int8)))
+    return edges.reshape(-1, 2)
+
+
+def detect_speech(data, sr, frame_ms=20, high_db=12.0, low_db=6.0, zcr_threshold=0.25,
+                  min_speech=0.25, min_gap=0.3, pad=0.1, chunk=1 << 22):
+    """Find the regions of a recording that contain speech
+
+    Frames are compared with the noise floor (a low percentile of the frame
+    energies), with hysteresis: a region starts where the energy rises
+    high_db above the floor and extends as long as it stays low_db above it.
+    Quiet frames with many zero crossings (fricatives such as s and f at
+    word edges) also extend a region. Regions closer than min_gap are merged,
+    shorter ones than min_speech dropped, and the rest padded by pad.
+
+    Args:
+        data: 1-D array of samples (may be a memory map)
+        sr: Sample rate in Hz
+        frame_ms: Frame length in milliseconds
+        high_db: Energy above the noise floor that starts a region
+        low_db: Energy above the noise floor that continues a region
+        zcr_threshold: Zero crossings per sample that continue a region at half of low_db
+        min_speech: Shortest region kept in seconds
+        min_gap: Shortest pause between two regions in seconds
+        pad: Seconds added on both sides of every region
+        chunk: Samples processed at a time
+
+    Returns:
+        Array of shape (n, 2) with the start and end of every region in seconds
+    """
+    frame_len = max(int(sr*frame_ms/1000), 1)
+    energy_db, zcr = frame_features(data, frame_len, chunk)
+    if not len(energy_db):
+        return np.zeros((0, 2))
+    floor = np.percentile(energy_db, 10)
+
+    # Hysteresis: keep the runs above the low threshold that reach the high one
+    trigger = energy_db > floor + high_db
+    candidate = (energy_db > floor + low_db) | ((zcr > zcr_threshold) & (energy_db > floor + low_db/2))
+    runs = _runs(candidate)
+    triggered = np.add.reduceat(trigger, runs[:, 0]) > 0 if len(runs) else np.zeros(0, dtype=bool)
+    # reduceat sums up to the next run's start, which includes only non-candidate frames
+    runs = runs[triggered]
+    if not len(runs):
+        return np.zeros((0, 2))
+
+    frame_sec = frame_len/sr
+    regions = runs*frame_sec
+    # Merge regions separated by short pauses
+    gaps = regions[1:, 0] - regions[:-1, 1]
+    first = np.concatenate(([True], gaps >= min_gap))
+    starts = regions[first, 0]
+    ends = regions[np.concatenate((first[1:], [True])), 1]
+    keep = ends - starts >= min_speech
+    starts = np.maximum(starts[keep] - pad, 0)
+    ends = np.minimum(ends[keep] + pad, len(data)/sr)
+    return np.column_stack((starts, ends))
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Waveform - Multi-resolution min/max envelopes for drawing long recordings
+"""
+import numpy as np
+
+
+class EnvelopePyramid:
+    """Min/max envelopes of a signal at several bucket sizes
+
+    Level 0 is the signal itself. Each further level stores the minimum and
+    maximum of every bucket of samples, with buckets growing by `factor` from
+    level to level. Drawing picks the level whose bucket count for the visible
+    window is closest to the available pixels, so peaks stay visible and the
+    number of plotted points does not depend on the recording length.
+    """
+
+    def __init__(self, data, sr, base_bucket=16, factor=4, chunk=1 << 22):
+        """Build the pyramid
+
+        Args:
+            data: 1-D array of samples (may be a memory map)
+            sr: Sample rate in Hz
+            base_bucket: Samples per bucket on the first envelope level
+            factor: Growth of the bucket size from level to level
+            chunk: Samples reduced at a time when building the first level
+        """
+        self.sr = sr
+        self.n_frames = len(data)
+        self.data = data
+        # (bucket size, mins, maxs) per level
+        self.levels = [(1, data, data)]
+
+        # First level, reduced chunk by chunk so memory maps are read sequentially
+        chunk -= chunk % base_bucket
+        parts = [self._reduce(data[start:start + chunk], base_bucket)
+                 for start in range(0, self.n_frames, chunk)]
+        mins = np.concatenate([p[0] for p in parts] or [data[:0]])
+        maxs = np.concatenate([p[1] for p in parts] or [data[:0]])
+        self.levels.append((base_bucket, mins, maxs))
+
+        bucket = base_bucket
+        while len(mins) > factor:
+            bucket *= factor
+            mins = self._reduce(mins, factor)[0]
+            maxs = self._reduce(maxs, factor)[1]
+            self.levels.append((bucket, mins, maxs))
+
+    @staticmethod
+    def _reduce(values, size):
+        """Return the min and max of every `size` values (the last bucket may be shorter)"""
+        n_full = len(values) - len(values) % size
+        full = values[:n_full].reshape(-1, size)
+        mins, maxs = full.min(axis=1), full.max(axis=1)
+        if n_full < len(values):
+            tail = values[n_full:]
+            mins = np.append(mins, tail.min())
+            maxs = np.append(maxs, tail.max())
+        return mins, maxs
+
+    @property
+    def limits(self):
+        """Overall (min, max) of the signal"""
+        _, mins, maxs = self.levels[-1]
+        return mins.min(), maxs.max()
+
+    def level_for(self, t0, t1, max_points=2000):
+        """Return the index of the finest level with at most max_points buckets in [t0, t1]"""
+        n_samples = max((t1 - t0) * self.sr, 1)
+        for i, (bucket, _, _) in enumerate(self.levels):
+            if n_samples / bucket <= max_points:
+                return i
+        return len(self.levels) - 1
+
+    def envelope(self, t0, t1, max_points=2000):
+        """Return the envelope of [t0, t1] as vertices of a single line
+
+        Every bucket becomes a vertical stroke from its minimum to its maximum.
+
+        Returns:
+            Tuple of (times, values) arrays
+        """
+        bucket, mins, maxs = self.levels[self.level_for(t0, t1, max_points)]
+        start = min(max(int(t0 * self.sr) // bucket, 0), len(mins))
+        stop = min(max(-(-int(t1 * self.sr) // bucket) + 1, start), len(mins))
+        times = np.arange(start, stop) * (bucket / self.sr)
+        if bucket == 1:
+            return times, np.asarray(mins[start:stop])
+        values = np.empty(2 * (stop - start), dtype=mins.dtype)
+        values[0::2] = mins[start:stop]
+        values[1::2] = maxs[start:stop]
+        return np.repeat(times, 2), values
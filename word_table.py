@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Word Table - Columnar storage and indexes for the aligned words of a transcript
+"""
+import numpy as np
+
+
+class OnsetIndex:
+    """Onsets of the aligned words, sorted for window queries
+
+    Keeps a sorted array of onsets together with the position of each word in
+    the word list, so finding the words whose onset lies in a time window is
+    a binary search instead of a scan over the whole transcript.
+    """
+
+    def __init__(self, words=()):
+        """Build the index
+
+        Args:
+            words: WordTable, or list of (id_string, word, start, end) tuples
+        """
+        self.rebuild(words)
+
+    @staticmethod
+    def _aligned(words, start, stop):
+        """Return the positions and onsets of the aligned words in words[start:stop]"""
+        if isinstance(words, WordTable):
+            # Read straight from the columns, without building row tuples
+            positions = np.flatnonzero(~np.isnan(words.starts[start:stop])) + start
+            return positions.astype(np.int64), words.starts[positions]
+        positions = np.array([i for i in range(start, stop) if words[i][2] is not None],
+                             dtype=np.int64)
+        return positions, np.array([words[i][2] for i in positions], dtype=np.float64)
+
+    def rebuild(self, words):
+        """Index all words (after the word list was renumbered or replaced)"""
+        positions, onsets = self._aligned(words, 0, len(words))
+        self._set(onsets, positions)
+
+    def update(self, words, start, stop):
+        """Re-index words[start:stop] after their timings changed in place
+
+        Args:
+            words: The full list of words
+            start: Index of the first changed word
+            stop: Index after the last changed word
+        """
+        if stop is None:
+            stop = len(words)
+        keep = (self.positions < start) | (self.positions >= stop)
+        new_positions, new_onsets = self._aligned(words, start, stop)
+        self._set(np.concatenate([self.onsets[keep], new_onsets]),
+                  np.concatenate([self.positions[keep], new_positions]))
+
+    def _set(self, onsets, positions):
+        order = np.lexsort((positions, onsets))
+        self.onsets = onsets[order]
+        self.positions = positions[order]
+
+    def query(self, t0, t1):
+        """Return the positions of the words with t0 < onset < t1, ordered by onset"""
+        lo = np.searchsorted(self.onsets, t0, side='right')
+        hi = np.searchsorted(self.onsets, t1, side='left')
+        return self.positions[lo:max(lo, hi)]
+
+    def __len__(self):
+        return len(self.onsets)
+
+
+class WordTable:
+    """Columnar store of the words of a transcript and their timings
+
+    Word IDs ("w0", "w1", ...) are kept as integers, the words as codes into a
+    string pool, and onsets/offsets in float64 arrays with NaN for words that
+    have not been aligned. Indexing and iteration give the same
+    (id_string, word, start, end) tuples as the list this replaces, so
+    existing callers keep working, while bulk queries are vectorized.
+    """
+
+    def __init__(self):
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.word_codes = np.zeros(0, dtype=np.int32)
+        self.starts = np.zeros(0, dtype=np.float64)
+        self.ends = np.zeros(0, dtype=np.float64)
+        self._pool = []
+        self._pool_codes = {}
+        self._onset_index = None
+
+    @classmethod
+    def from_text(cls, words):
+        """Build an unaligned table from a list of words, numbering them w0, w1, ..."""
+        table = cls()
+        table.ids = np.arange(len(words), dtype=np.int64)
+        table.word_codes = np.array([table._intern(ww) for ww in words], dtype=np.int32)
+        table.starts = np.full(len(words), np.nan)
+        table.ends = np.full(len(words), np.nan)
+        return table
+
+    @classmethod
+    def from_words(cls, words):
+        """Build a table from (id_string, word, start, end) tuples"""
+        table = cls()
+        table._set_rows(slice(0, 0), words)
+        return table
+
+    def _intern(self, word):
+        code = self._pool_codes.get(word)
+        if code is None:
+            code = len(self._pool)
+            self._pool.append(word)
+            self._pool_codes[word] = code
+        return code
+
+    @staticmethod
+    def _time(value):
+        return np.nan if value is None else float(value)
+
+    def _row(self, i):
+        start, end = self.starts[i], self.ends[i]
+        return ("w" + str(self.ids[i]), self._pool[self.word_codes[i]],
+                None if np.isnan(start) else float(start),
+                None if np.isnan(end) else float(end))
+
+    def _set_rows(self, key, rows):
+        """Replace the rows in slice key with rows (which may differ in number)"""
+        start, stop, _ = key.indices(len(self))
+        stop = max(start, stop)
+        rows = list(rows)
+        ids = np.array([int(ww[0][1:]) for ww in rows], dtype=np.int64)
+        codes = np.array([self._intern(ww[1]) for ww in rows], dtype=np.int32)
+        starts = np.array([self._time(ww[2]) for ww in rows], dtype=np.float64)
+        ends = np.array([self._time(ww[3]) for ww in rows], dtype=np.float64)
+        if stop - start == len(rows):
+            self.ids[start:stop] = ids
+            self.word_codes[start:stop] = codes
+            self.starts[start:stop] = starts
+            self.ends[start:stop] = ends
+            if self._onset_index is not None:
+                self._onset_index.update(self, start, stop)
+        else:
+            self.ids = np.concatenate([self.ids[:start], ids, self.ids[stop:]])
+            self.word_codes = np.concatenate([self.word_codes[:start], codes, self.word_codes[stop:]])
+            self.starts = np.concatenate([self.starts[:start], starts, self.starts[stop:]])
+            self.ends = np.concatenate([self.ends[:start], ends, self.ends[stop:]])
+            # Positions have moved
+            self._onset_index = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self._row(i) for i in range(*key.indices(len(self)))]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("word index out of range")
+        return self._row(key)
+
+    def __setitem__(self, key, value):
+        if isinstance(key, slice):
+            if key.step not in (None, 1):
+                raise ValueError("only contiguous slices can be assigned")
+            self._set_rows(key, value)
+        else:
+            if key < 0:
+                key += len(self)
+            if not 0 <= key < len(self):
+                raise IndexError("word index out of range")
+            self._set_rows(slice(key, key + 1), [value])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._row(i)
+
+    def to_list(self):
+        return list(self)
+
+    @property
+    def aligned(self):
+        """Boolean mask of the words that have timings"""
+        return ~np.isnan(self.starts)
+
+    def unaligned(self):
+        """Return the positions of all words without timings"""
+        return np.flatnonzero(np.isnan(self.starts))
+
+    def shift(self, offset, start=0, stop=None):
+        """Shift the timings of the words in [start, stop) by offset seconds"""
+        self.starts[start:stop] += offset
+        self.ends[start:stop] += offset
+        if self._onset_index is not None:
+            self._onset_index.update(self, start, len(self) if stop is None else stop)
+
+    @property
+    def onset_index(self):
+        """OnsetIndex of the table, kept up to date when rows are assigned"""
+        if self._onset_index is None:
+            self._onset_index = OnsetIndex(self)
+        return self._onset_index
+
+    def in_window(self, t0, t1):
+        """Return the positions of the words with t0 < onset < t1, ordered by onset"""
+        return self.onset_index.query(t0, t1)
+
+    def renumber(self):
+        """Number the words w0, w1, ... by position (after words were inserted or removed)"""
+        self.ids = np.arange(len(self), dtype=np.int64)
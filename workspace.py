@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Workspace - Isolated, reusable working directories for alignment jobs
+
+Every aligner works in a workspace of its own, so concurrent alignments never
+touch (or delete) each other's files. Released workspaces are kept in a
+bounded pool and handed to the next job, which keeps MFA's temporary
+directory and the directory entries in place instead of recreating them per
+run; the least recently used idle workspaces are removed when the pool is
+full. Pools can live on a RAM-backed tmpfs (/dev/shm) to avoid disk I/O.
+"""
+import atexit
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+MEMORY_ROOT = "/dev/shm"
+
+
+class Workspace:
+    """Private working directory of one aligner
+
+    Layout:
+        mfa_tmp/  corpus of the one-shot `mfa align` (see MFAWrapper.corpus_dir)
+        mfa/      MFA's own temporary directory (--temporary_directory)
+        other subdirectories are created on demand with subdir()
+    """
+
+    def __init__(self, pool, path):
+        self.pool = pool
+        self.path = Path(path)
+        self.corpus_dir = self.subdir("mfa_tmp")
+        self.mfa_temp_dir = self.subdir("mfa")
+
+    def subdir(self, name, clear=False):
+        """Return a subdirectory of the workspace, creating it if needed
+
+        Args:
+            name: Name of the subdirectory
+            clear: Whether to remove its previous contents (the directory itself is kept)
+        """
+        path = self.path / name
+        path.mkdir(exist_ok=True, parents=True)
+        if clear:
+            for entry in path.iterdir():
+                if entry.is_dir() and not entry.is_symlink():
+                    shutil.rmtree(entry, ignore_errors=True)
+                else:
+                    entry.unlink()
+        return path
+
+    def release(self):
+        """Hand the workspace back to its pool"""
+        self.pool.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class WorkspacePool:
+    """Bounded pool of workspaces with least-recently-used eviction"""
+
+    def __init__(self, root=None, max_idle=4, in_memory=False):
+        """Initialize the pool
+
+        Args:
+            root: Directory the workspaces are created in (optional, defaults
+                to a new temporary directory that is removed on close)
+            max_idle: Number of released workspaces kept for reuse
+            in_memory: Whether to create the default root on /dev/shm (if available)
+        """
+        self.max_idle = max_idle
+        if root is None:
+            base = None
+            if in_memory:
+                if os.path.isdir(MEMORY_ROOT) and os.access(MEMORY_ROOT, os.W_OK):
+                    base = MEMORY_ROOT
+                else:
+                    logger.warning(f"{MEMORY_ROOT} is not available, using a workspace on disk")
+            self.root = Path(tempfile.mkdtemp(prefix="semi_align_workspaces_", dir=base))
+            self._owns_root = True
+        else:
+            self.root = Path(root)
+            self.root.mkdir(exist_ok=True, parents=True)
+            self._owns_root = False
+        # Released workspaces, least recently used first
+        self._idle = OrderedDict()
+        self._busy = {}
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Return a workspace for exclusive use until it is released
+
+        Reuses the most recently released workspace, whose files are most
+        likely still cached, and creates a new one if none is idle.
+        """
+        with self._lock:
+            if self._idle:
+                _, workspace = self._idle.popitem(last=True)
+            else:
+                # mkdtemp gives a unique name, also across processes sharing the root
+                workspace = Workspace(self, tempfile.mkdtemp(prefix="ws_", dir=self.root))
+                logger.debug(f"Created workspace {workspace.path}")
+            self._busy[workspace.path] = workspace
+            return workspace
+
+    def release(self, workspace):
+        """Take a workspace back, removing the least recently used idle ones beyond max_idle"""
+        evicted = []
+        with self._lock:
+            if self._busy.pop(workspace.path, None) is None:
+                return
+            self._idle[workspace.path] = workspace
+            while len(self._idle) > self.max_idle:
+                evicted.append(self._idle.popitem(last=False)[0])
+        for path in evicted:
+            shutil.rmtree(path, ignore_errors=True)
+            logger.debug(f"Evicted workspace {path}")
+
+    def close(self):
+        """Remove all workspaces of the pool (only call when no job is running)"""
+        with self._lock:
+            paths = list(self._idle) + list(self._busy)
+            self._idle.clear()
+            self._busy.clear()
+        for path in paths:
+            shutil.rmtree(path, ignore_errors=True)
+        if self._owns_root:
+            shutil.rmtree(self.root, ignore_errors=True)
+
+
+# Process-wide pools, keyed on process, root directory and memory backing (a
+# forked child inherits the parent's pools but must not remove them)
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(root=None, in_memory=False):
+    """Return the shared workspace pool of this process for a root directory
+
+    Args:
+        root: Directory the workspaces are created in (optional, see WorkspacePool)
+        in_memory: Whether the default root is on /dev/shm
+
+    Returns:
+        WorkspacePool: The pool, created on first use and removed at exit
+    """
+    key = (os.getpid(), str(Path(root).resolve()) if root else None, bool(in_memory))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = WorkspacePool(root, in_memory=in_memory)
+        return pool
+
+
+def close_pools():
+    """Remove the workspaces of all pools of this process
+
+    Runs at exit. Worker processes that end without running atexit hooks
+    (e.g. multiprocessing workers) have to call it themselves.
+    """
+    pid = os.getpid()
+    with _pools_lock:
+        pools = [_pools.pop(key) for key in list(_pools) if key[0] == pid]
+    for pool in pools:
+        pool.close()
+
+
+atexit.register(close_pools)